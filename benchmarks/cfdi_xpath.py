@@ -0,0 +1,104 @@
+"""
+Latencia por documento de ``parse_xml_bytes``: ruta lxml/XPath contra
+ElementTree, sobre XML reales.
+
+    python -m benchmarks.cfdi_xpath facturas.zip carpeta/ otra.xml --repeticiones 5
+
+Acepta los mismos archivos que el Lector XML (.xml, .zip, .tar.gz, .xml.gz)
+y carpetas (se recorren completas). Cada XML se lee ``--repeticiones`` veces
+por ruta, alternando, y se queda el mejor tiempo de cada una. Imprime por
+formato: documentos, cuántos tomaron la ruta lxml, mediana / p95 de cada
+ruta y la mejora; si alguna salida difiere entre rutas lo dice.
+
+Sin XML a la mano: ``python -m benchmarks.corpus_cfdi muestra.zip``.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import pandas as pd
+
+from spgc.cfdi import documentos_de, indice_lxml, parse_xml_bytes
+
+EXTENSIONES = (".xml", ".zip", ".gz", ".tgz", ".tar")
+
+
+def _archivos(rutas: List[str]) -> Iterator[Path]:
+    for r in map(Path, rutas):
+        if r.is_dir():
+            yield from sorted(p for p in r.rglob("*") if p.is_file() and p.name.lower().endswith(EXTENSIONES))
+        else:
+            yield r
+
+
+def _mejor(nombre: str, xml_bytes: bytes, repeticiones: int) -> Tuple[float, float, bool]:
+    mejor = [float("inf"), float("inf")]
+    salidas = [None, None]
+    for _ in range(repeticiones):
+        for k, rapido in enumerate((False, True)):
+            t0 = time.perf_counter()
+            salidas[k] = parse_xml_bytes(nombre, xml_bytes, rapido=rapido)
+            mejor[k] = min(mejor[k], time.perf_counter() - t0)
+    return mejor[0], mejor[1], salidas[0] == salidas[1]
+
+
+def medir(rutas: List[str], repeticiones: int = 5) -> pd.DataFrame:
+    filas = []
+    for archivo in _archivos(rutas):
+        for nombre, xml_bytes in documentos_de(str(archivo), archivo.read_bytes()):
+            t_et, t_lxml, iguales = _mejor(nombre, xml_bytes, repeticiones)
+            filas.append({
+                "archivo": nombre,
+                "formato": parse_xml_bytes(nombre, xml_bytes)[1]["formato"],
+                "lxml": indice_lxml(xml_bytes) is not None,
+                "us_et": t_et * 1e6,
+                "us_lxml": t_lxml * 1e6,
+                "iguales": iguales,
+            })
+    return pd.DataFrame(filas)
+
+
+def resumen(df: pd.DataFrame) -> pd.DataFrame:
+    def _grupo(g: pd.DataFrame) -> pd.Series:
+        return pd.Series({
+            "docs": len(g),
+            "ruta lxml": int(g["lxml"].sum()),
+            "ET mediana us": g["us_et"].median(),
+            "lxml mediana us": g["us_lxml"].median(),
+            "ET p95 us": g["us_et"].quantile(0.95),
+            "lxml p95 us": g["us_lxml"].quantile(0.95),
+            "mejora": g["us_et"].sum() / g["us_lxml"].sum(),
+        })
+
+    por_formato = {f: _grupo(g) for f, g in df.groupby("formato")}
+    por_formato["TOTAL"] = _grupo(df)
+    return pd.DataFrame(por_formato).T.astype({"docs": int, "ruta lxml": int})
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.cfdi_xpath", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("rutas", nargs="+", help="XML, .zip / .tar.gz o carpetas")
+    ap.add_argument("--repeticiones", type=int, default=5, help="Lecturas por XML y ruta (se toma la mejor)")
+    ap.add_argument("--csv", help="Guardar aquí el detalle por documento")
+    args = ap.parse_args(argv)
+
+    df = medir(args.rutas, args.repeticiones)
+    if df.empty:
+        print("No se encontraron XML.", file=sys.stderr)
+        return 1
+    if args.csv:
+        df.to_csv(args.csv, index=False)
+
+    tabla = resumen(df)
+    formatos = {c: "{:,.1f}".format for c in tabla.columns if c.endswith(" us")}
+    print(tabla.to_string(formatters={**formatos, "mejora": "x{:.2f}".format}))
+    distintos = df.loc[~df["iguales"], "archivo"].tolist()
+    for nombre in distintos:
+        print(f"DIFERENTE: {nombre}", file=sys.stderr)
+    return 1 if distintos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Corpus sintético de CFDI para medir el Lector XML.
+
+    python -m benchmarks.corpus_cfdi muestra.zip -n 1000 --conceptos 1 8 --addenda 0 3
+
+Genera XML con la forma de las facturas reales de cada formato que conoce
+``detect_format`` (K9, ROYAN, WASH N CROSS y SAT GENERICO): Emisor con el
+nombre/RFC del proveedor, conceptos con sus traslados de IVA, Complemento con
+el TimbreFiscalDigital y, según el formato, los comentarios que lee cada
+parser (orden/unidad/servicio de K9 en la Addenda, RefPago/Obs de WASH en el
+concepto). Versión 3.3 y 4.0 alternadas. Mismo ``semilla`` = mismo corpus.
+
+``--conceptos`` y ``--addenda`` son rangos (mínimo, máximo) por documento;
+``--addenda`` cuenta nodos de relleno dentro de la Addenda.
+"""
+import argparse
+import random
+import sys
+import uuid
+import zipfile
+from typing import Iterator, Sequence, Tuple
+from xml.sax.saxutils import quoteattr
+
+from spgc.cfdi import NS_CFDI, NS_TFD, PROVEEDORES, SAT_GENERICO
+
+FORMATOS = ("K9", "ROYAN", "WASH N CROSS", SAT_GENERICO)
+
+EMISORES = {f: (needles[0], needles[-1]) for f, needles in PROVEEDORES.items()}
+EMISORES[SAT_GENERICO] = ("SERVICIOS INDUSTRIALES DEL NORTE SA DE CV", "SIN0101019A1")
+
+RECEPTORES = [
+    ("IGLOO TRANSPORT SA DE CV", "ITR150101AB1"),
+    ("LINCOLN FREIGHT SA DE CV", "LFR160202CD2"),
+    ("PICUS LOGISTICA SA DE CV", "PLO170303EF3"),
+]
+
+ACTIVIDADES = {
+    "K9": ["LAVADO DE CAJA SECA", "LAVADO DE TRACTOR", "LAVADO INTERIOR DE CAJA REFRIGERADA", "FUMIGACION DE CAJA"],
+    "ROYAN": ["SERVICIO DE REPARACION DE LLANTAS", "MANIOBRAS DE CARGA Y DESCARGA"],
+    "WASH N CROSS": ["LAVADO EXTERIOR", "LAVADO CON DESENGRASANTE", "LAVADO DE CAJA 53 PIES"],
+    SAT_GENERICO: ["MANTENIMIENTO PREVENTIVO UNIDAD", "REFACCIONES Y MANO DE OBRA", "SERVICIO DE GRUA"],
+}
+
+
+def _fecha(r: random.Random) -> str:
+    return f"2025-{r.randint(1, 12):02d}-{r.randint(1, 28):02d}T{r.randint(6, 20):02d}:{r.randint(0, 59):02d}:00"
+
+
+def _concepto(formato: str, r: random.Random, k: int) -> str:
+    cantidad = r.choice([1, 1, 1, 2, 3]) if formato != SAT_GENERICO else r.choice(["1", "2", "1.5", "4"])
+    unitario = round(r.uniform(150, 4500), 2)
+    importe = round(float(cantidad) * unitario, 2)
+    descripcion = r.choice(ACTIVIDADES[formato])
+    if formato == SAT_GENERICO:
+        descripcion += f" UNIDAD: T{r.randint(100, 999)}"
+    extra = ""
+    if formato == "WASH N CROSS" and r.random() < 0.7:
+        extra = f' RefPago="{r.randint(10000, 99999)}" Obs={quoteattr(f"SERVICIO {_fecha(r)[:10]}")}'
+    impuestos = ""
+    if r.random() > 0.05:  # algunos conceptos exentos, sin traslado
+        tasa = 0.08 if formato in ("K9", "WASH N CROSS") and r.random() < 0.5 else 0.16
+        impuestos = (
+            f'<cfdi:Impuestos><cfdi:Traslados><cfdi:Traslado Base="{importe:.2f}" Impuesto="002" '
+            f'TipoFactor="Tasa" TasaOCuota="{tasa:.6f}" Importe="{importe * tasa:.2f}"/>'
+            "</cfdi:Traslados></cfdi:Impuestos>"
+        )
+    return (
+        f'<cfdi:Concepto ClaveProdServ="78181500" NoIdentificacion="{k + 1}" Cantidad="{cantidad}" '
+        f'ClaveUnidad="E48" Unidad="SERVICIO" Descripcion={quoteattr(descripcion)} '
+        f'ValorUnitario="{unitario:.2f}" Importe="{importe:.2f}" ObjetoImp="02"{extra}>{impuestos}</cfdi:Concepto>'
+    )
+
+
+def _addenda(formato: str, r: random.Random, nodos: int) -> str:
+    partes = []
+    if formato == "K9":
+        partes.append(
+            f"<Observaciones>ORDEN K9 - {r.randint(1000, 9999)} SERVICIO REALIZADO "
+            f"{r.randint(1, 28):02d}/{r.randint(1, 12):02d}/2025 {r.randint(6, 20):02d}:00 "
+            f"{r.choice(['CAJA', 'TRACTOR'])} {r.choice('CT')}{r.randint(1, 999)}</Observaciones>"
+        )
+    for k in range(nodos):
+        partes.append(
+            f'<Dato Clave="D{k}" Referencia="{r.getrandbits(40):x}" Comentario="linea {k} de la addenda">'
+            f"Texto libre del proveedor {k}</Dato>"
+        )
+    return f"<cfdi:Addenda>{''.join(partes)}</cfdi:Addenda>" if partes else ""
+
+
+def cfdi_sintetico(formato: str, n_conceptos: int = 3, addenda: int = 1, version: str = "4.0", semilla: int = 0) -> bytes:
+    """Un CFDI ``version`` (3.3 / 4.0) de ``formato`` con ``n_conceptos`` y ``addenda`` nodos de relleno."""
+    r = random.Random(f"{formato}-{semilla}")
+    emisor, rfc = EMISORES[formato]
+    receptor, rfc_receptor = r.choice(RECEPTORES)
+    conceptos = "".join(_concepto(formato, r, k) for k in range(n_conceptos))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<cfdi:Comprobante xmlns:cfdi="{NS_CFDI[version]}" xmlns:tfd="{NS_TFD}" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        f'Version="{version}" Serie="{r.choice(["A", "F", "FAC"])}" Folio="{semilla + 1}" Fecha="{_fecha(r)}" '
+        'FormaPago="99" MetodoPago="PPD" Moneda="MXN" TipoDeComprobante="I" Exportacion="01" '
+        'LugarExpedicion="88000" SubTotal="0" Total="0">'
+        f'<cfdi:Emisor Rfc="{rfc}" Nombre={quoteattr(emisor)} RegimenFiscal="612"/>'
+        f'<cfdi:Receptor Rfc="{rfc_receptor}" Nombre={quoteattr(receptor)} DomicilioFiscalReceptor="88000" '
+        'RegimenFiscalReceptor="601" UsoCFDI="G03"/>'
+        f"<cfdi:Conceptos>{conceptos}</cfdi:Conceptos>"
+        f'<cfdi:Complemento><tfd:TimbreFiscalDigital Version="1.1" UUID="{uuid.UUID(int=r.getrandbits(128))}" '
+        f'FechaTimbrado="{_fecha(r)}" RfcProvCertif="SAT970701NN3" SelloCFD="{r.getrandbits(256):x}" '
+        f'NoCertificadoSAT="00001000000504465028" SelloSAT="{r.getrandbits(256):x}"/></cfdi:Complemento>'
+        f"{_addenda(formato, r, addenda)}</cfdi:Comprobante>"
+    ).encode("utf-8")
+
+
+def corpus(
+    n: int,
+    formatos: Sequence[str] = FORMATOS,
+    conceptos: Tuple[int, int] = (1, 8),
+    addenda: Tuple[int, int] = (0, 3),
+    semilla: int = 0,
+) -> Iterator[Tuple[str, bytes]]:
+    """``n`` documentos ``(nombre, bytes)``, formatos en rotación y tamaños al azar dentro de los rangos."""
+    r = random.Random(semilla)
+    for i in range(n):
+        formato = formatos[i % len(formatos)]
+        version = "4.0" if i % 2 else "3.3"
+        doc = cfdi_sintetico(formato, r.randint(*conceptos), r.randint(*addenda), version, semilla * 1_000_003 + i)
+        yield f"{formato.replace(' ', '_')}_{i:06d}.xml", doc
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.corpus_cfdi", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("salida", help="Archivo .zip a escribir")
+    ap.add_argument("-n", type=int, default=1000, help="Documentos")
+    ap.add_argument("--conceptos", type=int, nargs=2, default=(1, 8), metavar=("MIN", "MAX"))
+    ap.add_argument("--addenda", type=int, nargs=2, default=(0, 3), metavar=("MIN", "MAX"))
+    ap.add_argument("--formatos", nargs="+", default=list(FORMATOS), choices=FORMATOS)
+    ap.add_argument("--semilla", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    with zipfile.ZipFile(args.salida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for nombre, contenido in corpus(args.n, args.formatos, tuple(args.conceptos), tuple(args.addenda), args.semilla):
+            zf.writestr(nombre, contenido)
+    print(f"{args.n:,} XML -> {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Suite de rendimiento del Lector XML sobre el corpus sintético.
+
+    python -m benchmarks.lector_xml                          # 10, 1,000 y 50,000 XML
+    python -m benchmarks.lector_xml --tamanos 10 1000 --conceptos 1 20 --addenda 0 10
+    python -m benchmarks.lector_xml --procesos 4             # por procesar_documentos, como la página
+
+Cada tamaño corre en un proceso nuevo (para que su pico de memoria sea solo
+suyo): genera el corpus en memoria (``corpus_cfdi``), lee cada XML con
+``parse_xml_bytes`` (o con ``procesar_documentos`` si se da ``--procesos``),
+arma el DataFrame consolidado y lo exporta con ``dataframe_to_excel_bytes``.
+
+Imprime tiempos por etapa, XML/s (lectura y de punta a punta) y pico de
+memoria RSS, y agrega cada corrida a ``--resultados`` (CSV) con el commit y
+la versión de Python. Si ya había una corrida con la misma configuración,
+muestra el cambio contra la última. Con ``--procesos`` el pico de memoria es
+solo el del proceso principal.
+"""
+import argparse
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from benchmarks.corpus_cfdi import corpus
+from spgc.cfdi import FINAL_COLUMNS, dataframe_to_excel_bytes, parse_xml_bytes, procesar_documentos
+
+try:
+    import resource
+except ModuleNotFoundError:  # Windows: sin pico de memoria
+    resource = None
+
+TAMANOS = (10, 1_000, 50_000)
+RESULTADOS = Path(__file__).with_name("resultados_lector_xml.csv")
+# Columnas que definen "la misma configuración" para comparar corridas
+CONFIG = ["documentos", "conceptos", "addenda", "procesos"]
+
+
+def _pico_mb() -> float:
+    if resource is None:
+        return float("nan")
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb / 1024 / (1024 if sys.platform == "darwin" else 1)  # macOS lo da en bytes
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, cwd=Path(__file__).parent, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def correr(documentos: int, conceptos: tuple, addenda: tuple, procesos: int) -> Dict[str, object]:
+    """Una corrida completa; se llama dentro de un proceso nuevo."""
+    t0 = time.perf_counter()
+    docs = list(corpus(documentos, conceptos=conceptos, addenda=addenda))
+    t_generar = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    all_rows: List[Dict[str, object]] = []
+    errores = 0
+    if procesos:
+        resultados = {}
+        for lote in procesar_documentos(docs, total=len(docs), max_workers=procesos):
+            resultados.update((i, (rows, dbg)) for i, rows, dbg in lote)
+        salidas = [resultados[i] for i in range(len(docs))]
+    else:
+        salidas = (parse_xml_bytes(nombre, contenido) for nombre, contenido in docs)
+    for rows, dbg in salidas:
+        all_rows.extend(rows)
+        errores += dbg["estatus"] == "ERROR"
+    t_leer = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df = pd.DataFrame(all_rows, columns=FINAL_COLUMNS)
+    t_df = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    excel = dataframe_to_excel_bytes(df)
+    t_excel = time.perf_counter() - t0
+
+    total = t_leer + t_df + t_excel
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "documentos": documentos,
+        "conceptos": f"{conceptos[0]}-{conceptos[1]}",
+        "addenda": f"{addenda[0]}-{addenda[1]}",
+        "procesos": procesos,
+        "filas": len(df),
+        "errores": errores,
+        "corpus_mb": round(sum(len(c) for _, c in docs) / 1024 / 1024, 2),
+        "excel_mb": round(len(excel) / 1024 / 1024, 2),
+        "s_generar": round(t_generar, 3),
+        "s_leer": round(t_leer, 3),
+        "s_dataframe": round(t_df, 3),
+        "s_excel": round(t_excel, 3),
+        "s_total": round(total, 3),
+        "xml_s_leer": round(documentos / t_leer, 1),
+        "xml_s_total": round(documentos / total, 1),
+        "pico_mb": round(_pico_mb(), 1),
+    }
+
+
+def _anterior(previas: pd.DataFrame, fila: Dict[str, object]) -> pd.Series:
+    if previas.empty:
+        return None
+    mismas = previas
+    for c in CONFIG:
+        mismas = mismas[mismas[c].astype(str) == str(fila[c])]
+    return mismas.iloc[-1] if len(mismas) else None
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks.lector_xml", description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS), help="Documentos por corrida")
+    ap.add_argument("--conceptos", type=int, nargs=2, default=(1, 8), metavar=("MIN", "MAX"))
+    ap.add_argument("--addenda", type=int, nargs=2, default=(0, 3), metavar=("MIN", "MAX"))
+    ap.add_argument("--procesos", type=int, default=0, help="Workers de procesar_documentos (0 = en el mismo proceso)")
+    ap.add_argument("--resultados", default=str(RESULTADOS), help="CSV al que se agregan las corridas")
+    args = ap.parse_args(argv)
+
+    ruta = Path(args.resultados)
+    previas = pd.read_csv(ruta, dtype={"commit": str}).fillna({"commit": ""}) if ruta.exists() else pd.DataFrame()
+    ctx = multiprocessing.get_context("spawn")
+
+    for n in args.tamanos:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+            fila = ex.submit(correr, n, tuple(args.conceptos), tuple(args.addenda), args.procesos).result()
+
+        linea = (
+            f"{n:>7,} XML  {fila['filas']:>8,} filas  leer {fila['s_leer']:8.2f} s ({fila['xml_s_leer']:>8,.0f} XML/s)  "
+            f"excel {fila['s_excel']:8.2f} s  total {fila['s_total']:8.2f} s ({fila['xml_s_total']:>8,.0f} XML/s)  "
+            f"pico {fila['pico_mb']:,.0f} MB"
+        )
+        prev = _anterior(previas, fila)
+        if prev is not None:
+            linea += (
+                f"  | vs {prev['commit'] or prev['fecha']}: "
+                f"x{fila['xml_s_total'] / prev['xml_s_total']:.2f} XML/s, {fila['pico_mb'] - prev['pico_mb']:+,.0f} MB"
+            )
+        print(linea, flush=True)
+
+        # se escribe por corrida: si una se interrumpe, las anteriores quedan
+        pd.DataFrame([fila]).to_csv(ruta, mode="a", header=not ruta.exists(), index=False)
+    print(f"Resultados en {ruta}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,23 @@
 import re
 import io
+import hashlib
 import unicodedata
-from typing import List, Dict, Any, Tuple
+from functools import partial
+from pathlib import Path
+from typing import List, Dict, Any, NamedTuple, Tuple
 
 import pandas as pd
 import pdfplumber
 import streamlit as st
 
+from spgc.bitacora import BitacoraUUID, sha256_de
+
 st.set_page_config(page_title="Lector Facturas PDF → Excel", layout="wide")
 
+FUENTE = "pdf"
+# Los parsers viven en esta página: si cambia, la bitácora no reutiliza filas viejas
+VERSION_LECTOR = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:16]
+
 COLS = [
     "EMPRESA", "#FACTURA", "UUID", "FECHA FACTURA",
     "FECHA Y HR SERVICIO", "#UNIDAD",
@@ -25,6 +34,23 @@ def extract_pages_text(pdf_bytes: bytes) -> List[str]:
     with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
         return [(p.extract_text() or "") for p in pdf.pages]
 
+class DocumentoPDF(NamedTuple):
+    """Texto de un PDF (por página y completo); lo comparten la detección y el parser."""
+    sha256: str
+    pages: List[str]
+    full: str
+
+@st.cache_data(show_spinner=False, max_entries=500)
+def _pages_cached(sha256: str, _pdf_bytes: bytes) -> List[str]:
+    # la llave es el sha256 (los bytes no se vuelven a hashear)
+    return extract_pages_text(_pdf_bytes)
+
+def leer_documento(pdf_bytes: bytes, sha256: str = "") -> DocumentoPDF:
+    """pdfplumber corre una vez por contenido, también entre reruns de la página."""
+    sha256 = sha256 or sha256_de(pdf_bytes)
+    pages = _pages_cached(sha256, pdf_bytes)
+    return DocumentoPDF(sha256, pages, "\n".join(pages))
+
 def find_first(pattern: str, text: str, flags=0) -> str:
     """
     Devuelve el primer match.
@@ -118,9 +144,8 @@ def autodetect_format(full_text: str) -> str:
 
     return "K9"
 
-def parse_k9(pdf_bytes: bytes) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
-    pages = extract_pages_text(pdf_bytes)
-    full = "\n".join(pages)
+def parse_k9(doc: DocumentoPDF) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    full = doc.full
 
     empresa = find_first(r"NOMBRE COMERCIAL:\s*(.+)", full)
     uuid = find_first(r"\bUUID\s*\n\s*([0-9a-fA-F-]{36})", full, flags=re.I)
@@ -213,9 +238,8 @@ def parse_k9(pdf_bytes: bytes) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
 
     return header, items
 
-def parse_royan(pdf_bytes: bytes) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
-    pages = extract_pages_text(pdf_bytes)
-    full = "\n".join(pages)
+def parse_royan(doc: DocumentoPDF) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    pages, full = doc.pages, doc.full
 
     empresa = find_first(r"\nCliente:\s*\n?([A-Z0-9ÁÉÍÓÚÑ ]+)\n", full).strip()
     factura = find_first(r"\b(ROYAN-\d+)\b", full)
@@ -414,8 +438,8 @@ def normalize_wash_text(raw: str) -> str:
     t = re.sub(r"\n{2,}", "\n", t).strip()
     return t
 
-def parse_wash(pdf_bytes: bytes) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
-    pages = extract_pages_text(pdf_bytes)
+def parse_wash(doc: DocumentoPDF) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    pages = doc.pages
     if not pages:
         return {}, []
 
@@ -519,9 +543,8 @@ def parse_wash(pdf_bytes: bytes) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
 
     return header, items
 
-def parse_ana_cecilia(pdf_bytes: bytes) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
-    pages = extract_pages_text(pdf_bytes)
-    full = "\n".join(pages)
+def parse_ana_cecilia(doc: DocumentoPDF) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    full = doc.full
 
     # Normalizamos: sin acentos, y espacios “estándar”
     t = strip_accents(full)
@@ -618,54 +641,121 @@ def parse_ana_cecilia(pdf_bytes: bytes) -> Tuple[Dict[str, Any], List[Dict[str,
 
     return header, items
 
+def leer_pdf(doc: DocumentoPDF, do_autodetect: bool) -> Tuple[str, Dict[str, Any], pd.DataFrame]:
+    fmt = autodetect_format(doc.full) if do_autodetect else "K9"
+
+    if fmt == "K9":
+        header, items = parse_k9(doc)
+        rows = [{**header, **it} for it in items]
+        df = build_df(rows, iva_rate=0.08)
+
+    elif fmt == "ROYAN":
+        header, items = parse_royan(doc)
+        rows = [{**header, **it} for it in items]
+        df = build_df(rows, iva_rate=0.16)
+
+    elif fmt == "WASH":
+        header, items = parse_wash(doc)
+        df = build_df(items, iva_rate=0.08)
+
+    else:  # ANA_CECILIA
+        header, items = parse_ana_cecilia(doc)
+        df = build_df(items, iva_rate=0.08)  # no importa la tasa, se respeta IVA
+
+    return fmt, header, df
+
+def historial_excel(bitacora: BitacoraUUID) -> bytes:
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        pd.DataFrame(bitacora.filas(FUENTE), columns=COLS).to_excel(writer, index=False, sheet_name="FACTURAS")
+    return output.getvalue()
+
+@st.cache_resource(show_spinner=False)
+def abrir_bitacora(version: str) -> BitacoraUUID:
+    # Una conexión por proceso (check_same_thread=False), no una nueva en cada rerun
+    return BitacoraUUID(version=version)
+
 st.title("📄 Lector de Facturas PDF → Excel")
 st.caption("Sube 1 o varios PDFs. Formatos: K9 / ROYAN / WASH N CROSS / ANA CECILIA.")
 
+bitacora = abrir_bitacora(VERSION_LECTOR)
+n_historial = bitacora.total(FUENTE)
+if n_historial:
+    st.download_button(
+        f"⬇️ Descargar historial completo ({n_historial:,} facturas)",
+        data=partial(historial_excel, bitacora),
+        file_name="FACTURAS_HISTORIAL.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
 files = st.file_uploader("Sube tus facturas PDF", type=["pdf"], accept_multiple_files=True)
 
-col1, col2 = st.columns(2)
+col1, col2, col3 = st.columns(3)
 with col1:
     do_autodetect = st.checkbox("Autodetectar formato", value=True)
 with col2:
     show_debug = st.checkbox("Ver formato detectado por archivo", value=False)
+with col3:
+    reprocesar = st.checkbox("Volver a leer facturas del historial", value=False)
 
 if st.button("Procesar") and files:
     all_dfs: List[pd.DataFrame] = []
     debug_rows = []
+    duplicados = []
+    vistos: Dict[str, str] = {}
+    # UUID que esta sesión ya guardó: al volver a dar "Procesar" no se reportan
+    # como "Ya consolidada" ni suman ``vistas``
+    sesion = st.session_state.setdefault("pdf_uuids_sesion", set())
 
     for f in files:
         pdf_bytes = f.read()
-        pages = extract_pages_text(pdf_bytes)
-        full = "\n".join(pages)
-
-        fmt = autodetect_format(full) if do_autodetect else "K9"
-
-        if fmt == "K9":
-            header, items = parse_k9(pdf_bytes)
-            rows = [{**header, **it} for it in items]
-            df = build_df(rows, iva_rate=0.08)
-
-        elif fmt == "ROYAN":
-            header, items = parse_royan(pdf_bytes)
-            rows = [{**header, **it} for it in items]
-            df = build_df(rows, iva_rate=0.16)
+        sha = sha256_de(pdf_bytes)
+
+        # PDF ya leído antes (mismos bytes): sus filas salen de la bitácora
+        previo = None
+        if not reprocesar:
+            uuid_previo = bitacora.uuid_de_archivo(FUENTE, sha)
+            previo = bitacora.buscar(FUENTE, uuid_previo) if uuid_previo else None
+        if previo is not None:
+            if previo.uuid in vistos:
+                duplicados.append({"archivo": f.name, "UUID": previo.uuid, "motivo": f"Repetido en esta carga ({vistos[previo.uuid]})"})
+                continue
+            vistos[previo.uuid] = f.name
+            if previo.uuid not in sesion:
+                bitacora.marcar_vistas(FUENTE, [previo.uuid])
+                duplicados.append({"archivo": f.name, "UUID": previo.uuid, "motivo": f"Ya consolidada ({previo.alta}, {previo.archivo})"})
+            all_dfs.append(pd.DataFrame(previo.filas, columns=COLS))
+            debug_rows.append({"archivo": f.name, "formato_detectado": previo.formato,
+                               "filas_generadas": len(previo.filas), "origen": "historial"})
+            continue
 
-        elif fmt == "WASH":
-            header, items = parse_wash(pdf_bytes)
-            df = build_df(items, iva_rate=0.08)
+        fmt, header, df = leer_pdf(leer_documento(pdf_bytes, sha), do_autodetect)
 
-        else:  # ANA_CECILIA
-            header, items = parse_ana_cecilia(pdf_bytes)
-            df = build_df(items, iva_rate=0.08)  # no importa la tasa, se respeta IVA
+        uuid = (header.get("UUID") or "").strip().upper()
+        if uuid in vistos:
+            duplicados.append({"archivo": f.name, "UUID": uuid, "motivo": f"Repetido en esta carga ({vistos[uuid]})"})
+            continue
+        if uuid:
+            vistos[uuid] = f.name
+            ya = bitacora.buscar(FUENTE, uuid)
+            if ya is not None and not reprocesar and uuid not in sesion:
+                duplicados.append({"archivo": f.name, "UUID": uuid, "motivo": f"Ya consolidada desde otro PDF ({ya.alta}, {ya.archivo})"})
+            bitacora.guardar(FUENTE, [(uuid, f.name, fmt, df.to_dict("records"), {})])
+            bitacora.guardar_archivo(FUENTE, sha, uuid)
+            sesion.add(uuid)
 
         all_dfs.append(df)
-        debug_rows.append({"archivo": f.name, "formato_detectado": fmt, "filas_generadas": len(df)})
+        debug_rows.append({"archivo": f.name, "formato_detectado": fmt, "filas_generadas": len(df), "origen": "nuevo"})
 
     final_df = pd.concat(all_dfs, ignore_index=True) if all_dfs else pd.DataFrame(columns=COLS)
 
     st.success(f"Listo: {len(final_df)} registros (de {len(files)} archivos).")
     st.dataframe(final_df, width="stretch")
 
+    if duplicados:
+        st.subheader("Duplicados")
+        st.dataframe(pd.DataFrame(duplicados), width="stretch")
+
     if show_debug:
         st.subheader("Debug")
         st.dataframe(pd.DataFrame(debug_rows), width="stretch")
@@ -6,6 +6,8 @@ from typing import Optional, Tuple, List, Dict
 import pandas as pd
 import streamlit as st
 
+from spgc.normaliza import fecha
+
 
 # -----------------------------
 # Helpers
@@ -26,7 +28,7 @@ def find_col(df: pd.DataFrame, candidates: List[str]) -> Optional[str]:
 
 
 def safe_to_datetime(s: pd.Series) -> pd.Series:
-    return pd.to_datetime(s, errors="coerce")
+    return fecha(s, dayfirst=False)
 
 
 def mode_value(series: pd.Series):
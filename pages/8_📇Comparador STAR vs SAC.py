@@ -1,28 +1,14 @@
-import re
 import pandas as pd
 import streamlit as st
 from io import BytesIO
 
+from spgc.normaliza import importe, texto
+
 st.set_page_config(page_title="Confronta Liquidaciones vs Contabilidad", layout="wide")
 
 # -----------------------------
 # Helpers
 # -----------------------------
-def norm_text(x: object) -> str:
-    if x is None or (isinstance(x, float) and pd.isna(x)):
-        return ""
-    s = str(x).strip().upper()
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-def norm_amount(x: object, ndigits: int = 2) -> float:
-    try:
-        if x is None or (isinstance(x, float) and pd.isna(x)):
-            return float("nan")
-        return round(float(x), ndigits)
-    except Exception:
-        return float("nan")
-
 def build_seq(df: pd.DataFrame, key_cols: list[str], seq_col: str = "_seq") -> pd.DataFrame:
     # consecutivo por repetición dentro de la llave para empatar duplicados 1:1
     df = df.copy()
@@ -226,7 +212,7 @@ if catalogo_file is not None:
 
     # Normaliza contenido
     for col in ["NOMBRE", "USUARIO_STAR", "USUARIO_SAC", "TIPO"]:
-        catalogo[col] = catalogo[col].apply(norm_text)
+        catalogo[col] = texto(catalogo[col])
 
     tipos_disponibles = sorted([t for t in catalogo["TIPO"].dropna().unique().tolist() if t != ""])
 
@@ -270,11 +256,11 @@ cont = cont.rename(columns={
 
 for c in ["PR", "VIAJE", "TIPO_PAGO", "UNIDAD", "OWNER_LIQ", "TIPO_CONCEPTO"]:
     if c in liq.columns:
-        liq[c] = liq[c].apply(norm_text)
+        liq[c] = texto(liq[c])
 
 for c in ["PR", "VIAJE", "TIPO_PAGO", "UNIDAD", "OWNER_CONT", "TIPO_MOV"]:
     if c in cont.columns:
-        cont[c] = cont[c].apply(norm_text)
+        cont[c] = texto(cont[c])
 
 # Owner estándar según catálogo
 # Owner estándar según catálogo
@@ -290,8 +276,8 @@ else:
     liq["OWNER_STD_LIQ"] = ""
     cont["OWNER_STD_CONT"] = ""
     
-liq["IMPORTE"] = liq["IMPORTE"].apply(lambda x: norm_amount(x, ndigits))
-cont["IMPORTE"] = cont["IMPORTE"].apply(lambda x: norm_amount(x, ndigits))
+liq["IMPORTE"] = importe(liq["IMPORTE"], ndigits)
+cont["IMPORTE"] = importe(cont["IMPORTE"], ndigits)
 
 liq["IMPORTE"] = pd.to_numeric(liq["IMPORTE"], errors="coerce").astype("float32")
 cont["IMPORTE"] = pd.to_numeric(cont["IMPORTE"], errors="coerce").astype("float32")
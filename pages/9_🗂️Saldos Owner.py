@@ -1,33 +1,17 @@
-import re
 from io import BytesIO
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
+from spgc.normaliza import importe, texto
+
 st.set_page_config(page_title="Comparador STAR vs SAC v2", layout="wide")
 
 # ============================================================
 # Helpers
 # ============================================================
 
-def norm_text(x: object) -> str:
-    if x is None or (isinstance(x, float) and pd.isna(x)):
-        return ""
-    s = str(x).strip().upper()
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-
-def norm_amount(x: object, ndigits: int = 2) -> float:
-    try:
-        if x is None or (isinstance(x, float) and pd.isna(x)):
-            return float("nan")
-        return round(float(x), ndigits)
-    except Exception:
-        return float("nan")
-
-
 def build_seq(df: pd.DataFrame, key_cols: list[str], seq_col: str = "_seq") -> pd.DataFrame:
     out = df.copy()
     out[seq_col] = out.groupby(key_cols, dropna=False).cumcount() + 1
@@ -114,7 +98,7 @@ def standardize_catalog_columns(df: pd.DataFrame) -> pd.DataFrame:
     if missing:
         raise ValueError(f"Al catálogo le faltan columnas: {missing}")
     for col in required:
-        out[col] = out[col].apply(norm_text)
+        out[col] = texto(out[col])
     return out[required].copy()
 
 
@@ -201,7 +185,7 @@ liq = liq.rename(columns={
 # Excluir conceptos que no se reflejan en contabilidad
 # ------------------------------------------------------------
 if "Concepto" in liq.columns:
-    liq["Concepto"] = liq["Concepto"].apply(norm_text)
+    liq["Concepto"] = texto(liq["Concepto"])
 
     conceptos_excluir = [
         "ADICIONAL CHARGES"
@@ -221,14 +205,14 @@ cont = cont.rename(columns={
 
 for c in ["PR", "VIAJE", "TIPO_PAGO", "UNIDAD", "OWNER_LIQ", "TIPO_CONCEPTO"]:
     if c in liq.columns:
-        liq[c] = liq[c].apply(norm_text)
+        liq[c] = texto(liq[c])
 
 for c in ["PR", "VIAJE", "TIPO_PAGO", "UNIDAD", "OWNER_CONT", "TIPO_MOV"]:
     if c in cont.columns:
-        cont[c] = cont[c].apply(norm_text)
+        cont[c] = texto(cont[c])
 
-liq["IMPORTE"] = pd.to_numeric(liq["IMPORTE"].apply(lambda x: norm_amount(x, ndigits)), errors="coerce")
-cont["IMPORTE"] = pd.to_numeric(cont["IMPORTE"].apply(lambda x: norm_amount(x, ndigits)), errors="coerce")
+liq["IMPORTE"] = importe(liq["IMPORTE"], ndigits)
+cont["IMPORTE"] = importe(cont["IMPORTE"], ndigits)
 
 if catalogo is not None:
     liq["OWNER_STD_LIQ"] = liq["OWNER_LIQ"].map(star_to_nombre).fillna("")
@@ -9,6 +9,8 @@ import streamlit as st
 from io import BytesIO
 import time
 
+from spgc.normaliza import viaje
+
 st.set_page_config(page_title="Análisis Cross-Match Ultra", layout="wide")
 
 @st.cache_data(show_spinner=False)
@@ -20,10 +22,6 @@ def cargar_y_preparar_datos(reporte_bytes, cont_bytes):
     
     return df_reporte, df_cont
 
-def normalizar_viaje(serie):
-    """Normaliza viajes rápidamente"""
-    return serie.fillna('').astype(str).str.replace('/', '', regex=False).str.replace('-', '', regex=False).str.strip().str.upper()
-
 def analizar_ultra_rapido(df_base_no_existe, df_cont):
     """
     Versión ULTRA RÁPIDA usando merge de Pandas
@@ -41,7 +39,7 @@ def analizar_ultra_rapido(df_base_no_existe, df_cont):
         base = df_base_no_existe.copy()
         base['idx_original'] = range(len(base))
         base['poliza_norm'] = base['FOLIO_CONTRARECIBO'].fillna('').astype(str).str.strip().str.upper()
-        base['viaje_norm'] = normalizar_viaje(base.get('NUMERO_VIAJE', pd.Series()))
+        base['viaje_norm'] = viaje(base.get('NUMERO_VIAJE', pd.Series()))
         base['importe'] = pd.to_numeric(base['Importe'], errors='coerce').fillna(0).round(2)
         base['concepto_norm'] = base.get('Concepto contabilidad', '').fillna('').astype(str).str.upper()
         base['es_diesel'] = base['concepto_norm'].str.contains('DIESEL|CONSUMIBLES', na=False)
@@ -49,7 +47,7 @@ def analizar_ultra_rapido(df_base_no_existe, df_cont):
         # Normalizar contabilidad
         cont = df_cont.copy()
         cont['poliza_norm'] = cont['ClavePoliza'].fillna('').astype(str).str.strip().str.upper()
-        cont['viaje_norm'] = normalizar_viaje(cont['Referencia'])
+        cont['viaje_norm'] = viaje(cont['Referencia'])
         cont['importe'] = pd.to_numeric(cont['Importe'], errors='coerce').fillna(0).round(2)
         cont['concepto_norm'] = cont.get('ConceptoDetalle', '').fillna('').astype(str).str.upper()
         cont['tipo_poliza'] = cont['ClavePoliza'].fillna('').astype(str).str[:2]
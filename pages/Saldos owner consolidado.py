@@ -10,7 +10,6 @@
 
 import re
 import time
-import unicodedata
 from io import BytesIO
 from pathlib import Path
 
@@ -18,66 +17,14 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
+from spgc.normaliza import concepto, importe, llave, norm_for_key, texto, viaje
+
 st.set_page_config(page_title="Saldos Owner Modular", layout="wide")
 
 # ============================================================
 # HELPERS GENERALES
 # ============================================================
 
-def norm_text(x: object) -> str:
-    if x is None or pd.isna(x):
-        return ""
-    s = str(x).strip().upper()
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-
-def norm_for_key(x: object) -> str:
-    s = norm_text(x)
-    s = re.sub(r"[^A-Z0-9]+", " ", s)
-    return re.sub(r"\s+", " ", s).strip()
-
-
-def norm_amount(x: object, ndigits: int = 2) -> float:
-    try:
-        if x is None or pd.isna(x):
-            return float("nan")
-        if isinstance(x, str):
-            x = x.replace(",", "").replace("$", "").strip()
-        return round(float(x), ndigits)
-    except Exception:
-        return float("nan")
-
-
-def normalizar_viaje(serie):
-    return serie.fillna('').astype(str).str.replace('/', '', regex=False).str.replace('-', '', regex=False).str.strip().str.upper()
-
-
-def strip_concept_suffix(x: object) -> str:
-    s = norm_text(x)
-    s = re.sub(r"\s+-\s+\d+.*$", "", s)
-    s = re.sub(r"\s+-\s+[A-Z0-9]+.*$", "", s)
-    return s.strip()
-
-
-def canonical_concept(x: object, concept_map: dict[str, str] | None = None) -> str:
-    s = strip_concept_suffix(x)
-    k = norm_for_key(s)
-    if concept_map and k in concept_map:
-        return concept_map[k]
-    rules = [
-        (r"\bPERSONAL LOAN\b|\bLOAN\b|\bPRESTAMO\b", "LOAN/PERSONAL LOAN"),
-        (r"\bDIESEL\b|\bCONSUMIBLES\b", "CXP DIESEL/CONSUMIBLES"),
-        (r"\bANTICIPO\b|\bADVANCE\b", "CXP ANTICIPO"),
-    ]
-    for pattern, value in rules:
-        if re.search(pattern, k):
-            return value
-    return k
-
-
 def read_table(file_obj, preferred_sheet: str | None = None, usecols=None) -> pd.DataFrame:
     suffix = Path(file_obj.name).suffix.lower()
     raw = file_obj.getvalue()
@@ -169,9 +116,9 @@ def ejecutar_etapa_1_ingresos(liq_file, cont_file, ndigits: int, liq_tipo: str):
         # Normalizar ANTES de filtrar
         for c in ["PR", "VIAJE", "TIPO_PAGO", "UNIDAD", "OWNER_LIQ", "TIPO_CONCEPTO"]:
             if c in liq.columns:
-                liq[c] = liq[c].apply(norm_text)
+                liq[c] = texto(liq[c], sin_acentos=True)
         
-        liq["IMPORTE"] = pd.to_numeric(liq["IMPORTE"].apply(lambda x: norm_amount(x, ndigits)), errors="coerce")
+        liq["IMPORTE"] = importe(liq["IMPORTE"], ndigits)
         
         # Filtrar
         liq_f = liq[liq["TIPO_CONCEPTO"] == liq_tipo].copy()
@@ -198,9 +145,9 @@ def ejecutar_etapa_1_ingresos(liq_file, cont_file, ndigits: int, liq_tipo: str):
         # Normalizar ANTES de filtrar
         for c in ["PR", "VIAJE", "TIPO_PAGO", "UNIDAD", "OWNER_CONT", "TIPO_MOV"]:
             if c in cont.columns:
-                cont[c] = cont[c].apply(norm_text)
+                cont[c] = texto(cont[c], sin_acentos=True)
         
-        cont["IMPORTE"] = pd.to_numeric(cont["IMPORTE"].apply(lambda x: norm_amount(x, ndigits)), errors="coerce")
+        cont["IMPORTE"] = importe(cont["IMPORTE"], ndigits)
         
         # Filtrar solo H
         cont_f = cont[cont["TIPO_MOV"] == "H"].copy()
@@ -338,15 +285,15 @@ def ejecutar_etapa_2_costos(cont_file, base_file, vales_file, ids_etapa1_file,
         c_vale = resolve_col(cont_raw, ["Vale", "No Vale"], required=False)
         
         cont = cont_raw.copy()
-        cont["TIPO_MOV"] = cont[c_mov].apply(norm_text)
+        cont["TIPO_MOV"] = texto(cont[c_mov], sin_acentos=True)
         cont = cont[cont["TIPO_MOV"] == "D"].copy()  # Solo D
         
-        cont["POLIZA_KEY"] = cont[c_poliza].apply(norm_for_key)
-        cont["UNIDAD_KEY"] = cont[c_unidad].apply(norm_for_key)
-        cont["VIAJE_KEY"] = cont[c_referencia].apply(norm_for_key) if c_referencia else ""
-        cont["VALE_KEY"] = cont[c_vale].apply(norm_for_key) if c_vale else ""
-        cont["CONCEPTO_KEY"] = cont[c_concepto].apply(lambda x: canonical_concept(x, concept_map)) if c_concepto else ""
-        cont["IMPORTE_KEY"] = cont[c_importe].apply(lambda x: norm_amount(x, ndigits))
+        cont["POLIZA_KEY"] = llave(cont[c_poliza])
+        cont["UNIDAD_KEY"] = llave(cont[c_unidad])
+        cont["VIAJE_KEY"] = llave(cont[c_referencia]) if c_referencia else ""
+        cont["VALE_KEY"] = llave(cont[c_vale]) if c_vale else ""
+        cont["CONCEPTO_KEY"] = concepto(cont[c_concepto], concept_map) if c_concepto else ""
+        cont["IMPORTE_KEY"] = importe(cont[c_importe], ndigits)
         cont["ROW_ID_CONT"] = range(1, len(cont) + 1)
         
         # Filtrar ya matcheados
@@ -368,11 +315,11 @@ def ejecutar_etapa_2_costos(cont_file, base_file, vales_file, ids_etapa1_file,
             c_importe = resolve_col(base_raw, ["importe", "monto", "total", "Importe"])
             
             base = base_raw.copy()
-            base["POLIZA_KEY"] = base[c_poliza].apply(norm_for_key)
-            base["UNIDAD_KEY"] = base[c_unidad].apply(norm_for_key)
-            base["VIAJE_KEY"] = base[c_viaje].apply(norm_for_key)
-            base["CONCEPTO_KEY"] = base[c_concepto].apply(lambda x: canonical_concept(x, concept_map))
-            base["IMPORTE_KEY"] = base[c_importe].apply(lambda x: norm_amount(x, ndigits))
+            base["POLIZA_KEY"] = llave(base[c_poliza])
+            base["UNIDAD_KEY"] = llave(base[c_unidad])
+            base["VIAJE_KEY"] = llave(base[c_viaje])
+            base["CONCEPTO_KEY"] = concepto(base[c_concepto], concept_map)
+            base["IMPORTE_KEY"] = importe(base[c_importe], ndigits)
             base["ROW_ID_BASE"] = range(1, len(base) + 1)
             
             # Matching simplificado
@@ -438,10 +385,10 @@ def ejecutar_etapa_2_costos(cont_file, base_file, vales_file, ids_etapa1_file,
             c_importe = resolve_col(vales_raw, ["Total", "Importe", "TotalVale"])
             
             vales = vales_raw.copy()
-            vales["VALE_KEY"] = vales[c_vale].apply(norm_for_key)
-            vales["UNIDAD_KEY"] = vales[c_unidad].apply(norm_for_key)
-            vales["CONCEPTO_KEY"] = vales[c_concepto].apply(lambda x: canonical_concept(x, concept_map))
-            vales["IMPORTE_KEY"] = vales[c_importe].apply(lambda x: norm_amount(x, ndigits))
+            vales["VALE_KEY"] = llave(vales[c_vale])
+            vales["UNIDAD_KEY"] = llave(vales[c_unidad])
+            vales["CONCEPTO_KEY"] = concepto(vales[c_concepto], concept_map)
+            vales["IMPORTE_KEY"] = importe(vales[c_importe], ndigits)
             vales["ROW_ID_VALE"] = range(1, len(vales) + 1)
             
             # Matching
@@ -544,12 +491,12 @@ def ejecutar_etapa_3_crossmatch(base_no_existe_file, cont_file, ids_previos_file
         c_owner = resolve_col(cont_raw, ["NombreCuentaContable"], required=False)
         
         cont = cont_raw.copy()
-        cont["TIPO_MOV"] = cont[c_mov].apply(norm_text)
-        cont["POLIZA_KEY"] = cont[c_poliza].apply(norm_for_key)
-        cont["VIAJE_KEY"] = cont[c_referencia].apply(norm_for_key) if c_referencia else ""
-        cont["IMPORTE_KEY"] = cont[c_importe].apply(lambda x: norm_amount(x, ndigits))
-        cont["CONCEPTO_KEY"] = cont[c_concepto].apply(norm_text) if c_concepto else ""
-        cont["OWNER_CONT"] = cont[c_owner].apply(norm_text) if c_owner else ""
+        cont["TIPO_MOV"] = texto(cont[c_mov], sin_acentos=True)
+        cont["POLIZA_KEY"] = llave(cont[c_poliza])
+        cont["VIAJE_KEY"] = llave(cont[c_referencia]) if c_referencia else ""
+        cont["IMPORTE_KEY"] = importe(cont[c_importe], ndigits)
+        cont["CONCEPTO_KEY"] = texto(cont[c_concepto], sin_acentos=True) if c_concepto else ""
+        cont["OWNER_CONT"] = texto(cont[c_owner], sin_acentos=True) if c_owner else ""
         cont["ROW_ID_CONT"] = range(1, len(cont) + 1)
         cont["_UNIDAD_ORIG"] = cont[c_unidad]
         cont["_VIAJE_ORIG"] = cont[c_referencia] if c_referencia else ""
@@ -574,9 +521,9 @@ def ejecutar_etapa_3_crossmatch(base_no_existe_file, cont_file, ids_previos_file
             base['poliza_norm'] = ''
         
         if 'VIAJE_KEY' in base.columns:
-            base['viaje_norm'] = normalizar_viaje(base['VIAJE_KEY'])
+            base['viaje_norm'] = viaje(base['VIAJE_KEY'])
         elif 'NUMERO_VIAJE' in base.columns:
-            base['viaje_norm'] = normalizar_viaje(base['NUMERO_VIAJE'])
+            base['viaje_norm'] = viaje(base['NUMERO_VIAJE'])
         else:
             base['viaje_norm'] = ''
         
@@ -594,7 +541,7 @@ def ejecutar_etapa_3_crossmatch(base_no_existe_file, cont_file, ids_previos_file
         
         # Preparar contabilidad
         cont['poliza_norm'] = cont['POLIZA_KEY'].fillna('').astype(str).str.strip().str.upper()
-        cont['viaje_norm'] = normalizar_viaje(cont['VIAJE_KEY'])
+        cont['viaje_norm'] = viaje(cont['VIAJE_KEY'])
         cont['importe'] = pd.to_numeric(cont['IMPORTE_KEY'], errors='coerce').fillna(0).round(2)
         cont['concepto_norm'] = cont['CONCEPTO_KEY'].fillna('').astype(str).str.upper()
         cont['tipo_poliza'] = cont['POLIZA_KEY'].fillna('').astype(str).str[:2]
@@ -1,71 +1,18 @@
 import re
-import unicodedata
 from io import BytesIO
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
+from spgc.normaliza import concepto, importe, llave, norm_for_key, norm_text, texto
+
 st.set_page_config(page_title="Saldos Owner - Costos con Vales", layout="wide")
 
 # ============================================================
 # Helpers generales
 # ============================================================
 
-def norm_text(x: object) -> str:
-    if x is None or pd.isna(x):
-        return ""
-    s = str(x).strip().upper()
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = re.sub(r"\s+", " ", s)
-    return s
-
-
-def norm_for_key(x: object) -> str:
-    s = norm_text(x)
-    s = re.sub(r"[^A-Z0-9]+", " ", s)
-    return re.sub(r"\s+", " ", s).strip()
-
-
-def norm_amount(x: object, ndigits: int = 2) -> float:
-    try:
-        if x is None or pd.isna(x):
-            return float("nan")
-        if isinstance(x, str):
-            x = x.replace(",", "").replace("$", "").strip()
-        return round(float(x), ndigits)
-    except Exception:
-        return float("nan")
-
-
-def strip_concept_suffix(x: object) -> str:
-    """Quita sufijos tipo ' - 20170908' sin destruir el concepto base."""
-    s = norm_text(x)
-    s = re.sub(r"\s+-\s+\d+.*$", "", s)
-    s = re.sub(r"\s+-\s+[A-Z0-9]+.*$", "", s)
-    return s.strip()
-
-
-def canonical_concept(x: object, concept_map: dict[str, str] | None = None) -> str:
-    """Normaliza conceptos. No requiere catalogo; el catalogo solo mejora equivalencias futuras."""
-    s = strip_concept_suffix(x)
-    k = norm_for_key(s)
-    if concept_map and k in concept_map:
-        return concept_map[k]
-
-    # Reglas base muy conservadoras. Se pueden ampliar despues con catalogo.
-    rules = [
-        (r"\bPERSONAL LOAN\b|\bLOAN\b|\bPRESTAMO\b", "LOAN/PERSONAL LOAN"),
-        (r"\bDIESEL\b|\bCONSUMIBLES\b", "CXP DIESEL/CONSUMIBLES"),
-        (r"\bANTICIPO\b|\bADVANCE\b", "CXP ANTICIPO"),
-    ]
-    for pattern, value in rules:
-        if re.search(pattern, k):
-            return value
-    return k
-
-
 def read_table(file_obj, preferred_sheet: str | None = None, usecols=None) -> pd.DataFrame:
     suffix = Path(file_obj.name).suffix.lower()
     raw = file_obj.getvalue()
@@ -140,7 +87,9 @@ def load_concept_map(file_obj) -> dict[str, str]:
     if not src or not dst:
         st.warning("El catalogo de conceptos debe tener columnas tipo concepto_origen y concepto_canonico. Se ignoro el catalogo.")
         return {}
-    return {norm_for_key(a): norm_for_key(b) for a, b in zip(df[src], df[dst]) if norm_for_key(a) and norm_for_key(b)}
+    pares = pd.DataFrame({"a": llave(df[src]), "b": llave(df[dst])})
+    pares = pares[(pares["a"] != "") & (pares["b"] != "")]
+    return dict(zip(pares["a"], pares["b"]))
 
 
 # ============================================================
@@ -157,15 +106,15 @@ def prep_contabilidad(cont_raw: pd.DataFrame, ndigits: int, concept_map: dict[st
     c_vale = resolve_col(cont_raw, ["Vale", "No Vale", "Numero Vale"], required=False)
 
     out = cont_raw.copy()
-    out["TIPO_MOV"] = out[c_mov].apply(norm_text)
+    out["TIPO_MOV"] = texto(out[c_mov], sin_acentos=True)
     if tipo_mov is not None:
-        out = out[out["TIPO_MOV"] == norm_text(tipo_mov)].copy()
-    out["POLIZA_KEY"] = out[c_poliza].apply(norm_for_key)
-    out["UNIDAD_KEY"] = out[c_unidad].apply(norm_for_key)
-    out["VIAJE_KEY"] = out[c_referencia].apply(norm_for_key) if c_referencia else ""
-    out["VALE_KEY"] = out[c_vale].apply(norm_for_key) if c_vale else ""
-    out["CONCEPTO_KEY"] = out[c_concepto].apply(lambda x: canonical_concept(x, concept_map)) if c_concepto else ""
-    out["IMPORTE_KEY"] = out[c_importe].apply(lambda x: norm_amount(x, ndigits))
+        out = out[out["TIPO_MOV"] == norm_text(tipo_mov, sin_acentos=True)].copy()
+    out["POLIZA_KEY"] = llave(out[c_poliza])
+    out["UNIDAD_KEY"] = llave(out[c_unidad])
+    out["VIAJE_KEY"] = llave(out[c_referencia]) if c_referencia else ""
+    out["VALE_KEY"] = llave(out[c_vale]) if c_vale else ""
+    out["CONCEPTO_KEY"] = concepto(out[c_concepto], concept_map) if c_concepto else ""
+    out["IMPORTE_KEY"] = importe(out[c_importe], ndigits)
     out["ROW_ID_CONT"] = range(1, len(out) + 1)
 
     colmap = {
@@ -188,11 +137,11 @@ def prep_base_saldos(base_raw: pd.DataFrame, ndigits: int, concept_map: dict[str
     c_importe = resolve_col(base_raw, ["importe", "monto", "total"])
 
     out = base_raw.copy()
-    out["POLIZA_KEY"] = out[c_poliza].apply(norm_for_key)
-    out["UNIDAD_KEY"] = out[c_unidad].apply(norm_for_key)
-    out["VIAJE_KEY"] = out[c_viaje].apply(norm_for_key)
-    out["CONCEPTO_KEY"] = out[c_concepto].apply(lambda x: canonical_concept(x, concept_map))
-    out["IMPORTE_KEY"] = out[c_importe].apply(lambda x: norm_amount(x, ndigits))
+    out["POLIZA_KEY"] = llave(out[c_poliza])
+    out["UNIDAD_KEY"] = llave(out[c_unidad])
+    out["VIAJE_KEY"] = llave(out[c_viaje])
+    out["CONCEPTO_KEY"] = concepto(out[c_concepto], concept_map)
+    out["IMPORTE_KEY"] = importe(out[c_importe], ndigits)
     out["ROW_ID_BASE"] = range(1, len(out) + 1)
     return out
 
@@ -216,11 +165,11 @@ def prep_vales(vales_raw: pd.DataFrame, ndigits: int, concept_map: dict[str, str
     out["SOURCE"] = "VALES"
     out["ROW_ID_ORIGEN"] = range(1, len(out) + 1)
     out["ROW_ID_VALE"] = range(1, len(out) + 1)
-    out["VALE_KEY"] = out[c_vale].apply(norm_for_key)
-    out["UNIDAD_KEY"] = out[c_unidad].apply(norm_for_key)
-    out["CONCEPTO_KEY"] = out[c_concepto].apply(lambda x: canonical_concept(x, concept_map))
-    out["POLIZA_KEY"] = out[c_contrarrecibo].apply(norm_for_key) if c_contrarrecibo else ""
-    out["IMPORTE_KEY"] = out[c_importe].apply(lambda x: norm_amount(x, ndigits))
+    out["VALE_KEY"] = llave(out[c_vale])
+    out["UNIDAD_KEY"] = llave(out[c_unidad])
+    out["CONCEPTO_KEY"] = concepto(out[c_concepto], concept_map)
+    out["POLIZA_KEY"] = llave(out[c_contrarrecibo]) if c_contrarrecibo else ""
+    out["IMPORTE_KEY"] = importe(out[c_importe], ndigits)
     out["OBS_KEY"] = ""  # Los vales no tienen observaciones
     out["VIAJE_KEY"] = ""  # Los vales no tienen viaje
     return out
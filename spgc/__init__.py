@@ -0,0 +1,7 @@
+"""
+Módulos compartidos del Sistema de Prorrateo de Gastos y Costos (SPGC).
+
+Las páginas de Streamlit (carpeta ``pages/``) importan de aquí la lógica que
+no depende de la interfaz, para poder reutilizarla entre páginas y ejecutarla
+fuera del navegador.
+"""
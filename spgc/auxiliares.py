@@ -0,0 +1,706 @@
+"""
+Limpieza de reportes auxiliares STAR 1 / STAR 2.0 (Reporte Auxiliares).
+
+Lectura de .xlsx/.xls/HTML/SpreadsheetML a DataFrame crudo (HTML y
+SpreadsheetML en streaming con ``iterparse``), detección del modo de cada
+archivo con sus primeros renglones y limpieza de cada archivo. ``procesar_archivos`` lee y limpia varios
+archivos en procesos aparte y los concatena en el orden en que se subieron;
+con un ``CacheParquet`` se salta los archivos que ya se limpiaron antes.
+"""
+import hashlib
+import html
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from lxml import etree
+
+from spgc import normaliza
+from spgc.cache import CacheParquet, llave_cache
+from spgc.normaliza import fecha_texto, por_valor
+
+# A partir de cuántos archivos conviene pagar el arranque de procesos
+MIN_ARCHIVOS_PARALELO = 3
+
+# =====================================================
+# --- UTILIDADES BÁSICAS ---
+# =====================================================
+
+def _to_num_safe(x):
+    """Convierte a float tolerando comas/$. NaN -> 0.0"""
+    if pd.isna(x):
+        return 0.0
+    s = str(x).replace(",", "").replace("$", "").strip()
+    try:
+        return float(s)
+    except Exception:
+        return 0.0
+
+def _to_num_col(s: pd.Series) -> pd.Series:
+    """``_to_num_safe`` por columna: se evalúa una vez por valor distinto."""
+    return por_valor(s, lambda u: u.map(_to_num_safe)).astype(float)
+
+def _limpia(s: pd.Series) -> pd.Series:
+    return s.astype(str).str.replace("\xa0", " ", regex=False).str.strip()
+
+def _texto(s: pd.Series) -> pd.Series:
+    """Columna como texto sin NBSP ni espacios en los extremos."""
+    return por_valor(s, _limpia)
+
+def _vacio(s: pd.Series) -> pd.Series:
+    """Celda vacía como la ve ``str(x).strip()``: '', 'nan' o 'None'."""
+    return s.astype(str).str.strip().isin({"", "nan", "None"})
+
+def _drop_summary_rows(df: pd.DataFrame, cols: list[str] | None = None) -> pd.DataFrame:
+    """
+    Elimina renglones de sumatorias/globales donde cualquier columna de `cols`
+    tenga valores como 'Sumas Totales', 'Suma Total', 'Total', 'Totales',
+    'Saldo', 'Saldos', 'Saldo inicial'.
+    """
+    if cols is None:
+        cols = list(df.columns)
+
+    summary_re = re.compile(
+        r"^\s*(sumas?\s+totales?|suma\s+total|totales?|total|saldo|saldos?|saldo\s+inicial:?)\s*$",
+        re.IGNORECASE,
+    )
+
+    mask = pd.Series(False, index=df.index)
+    for c in cols:
+        if c in df.columns:
+            mask |= por_valor(df[c], lambda u: _limpia(u).str.match(summary_re)).astype(bool)
+    return df.loc[~mask].reset_index(drop=True)
+
+# =====================================================
+# --- LECTURA EN STREAMING (HTML / SpreadsheetML) ---
+# =====================================================
+
+SS_NS = "urn:schemas-microsoft-com:office:spreadsheet"
+_SS = "{%s}" % SS_NS
+
+
+class _Columnas:
+    """Buffers por columna: cada fila se reparte al llegar, sin lista de listas."""
+
+    def __init__(self):
+        self.cols: List[List[str]] = []
+        self.n = 0
+
+    def agregar(self, fila: List[str]) -> None:
+        for j, v in enumerate(fila):
+            if j == len(self.cols):
+                self.cols.append([""] * self.n)
+            self.cols[j].append(v)
+        for col in self.cols[len(fila):]:
+            col.append("")
+        self.n += 1
+
+    def frame(self) -> Optional[pd.DataFrame]:
+        if not self.n:
+            return None
+        return pd.DataFrame({j: col for j, col in enumerate(self.cols)}, index=pd.RangeIndex(self.n))
+
+
+def _liberar(el) -> None:
+    # Suelta el elemento ya procesado y sus hermanos anteriores
+    el.clear()
+    while el.getprevious() is not None:
+        del el.getparent()[0]
+
+
+def _colspan(td) -> int:
+    try:
+        return max(int(td.get("colspan", 1)), 1)
+    except ValueError:
+        return 1
+
+
+def _texto_celda(td) -> str:
+    # como BeautifulSoup get_text(strip=True); atajo para la celda de puro texto
+    if len(td) == 0:
+        return (td.text or "").strip()
+    return "".join(t.strip() for t in td.itertext())
+
+
+def _tabla_html(raw: bytes, nrows: int = None) -> Optional[pd.DataFrame]:
+    """
+    Primera ``<table>`` con renglones (``<tr>`` de cualquier profundidad),
+    leída con ``iterparse``: cada ``<tr>`` se vuelca a los buffers al cerrarse
+    y se libera. Texto de celda como ``get_text(strip=True)``; ``colspan``
+    deja celdas vacías para no desalinear columnas. Con ``nrows`` se deja de
+    leer al juntar esos renglones.
+    """
+    # Etiquetas con prefijo (<x:table>, <ss:td>...) se buscan una vez en los bytes
+    prefijos = {p.decode("ascii").lower() for p in re.findall(rb"<(\w+):(?:table|tr|td|th)\b", raw, re.IGNORECASE)}
+    def _con_prefijos(nombre):
+        return {nombre} | {f"{p}:{nombre}" for p in prefijos}
+    tablas, renglones = _con_prefijos("table"), _con_prefijos("tr")
+    celdas = _con_prefijos("td") | _con_prefijos("th")
+
+    cols, depth = _Columnas(), 0
+    for ev, el in etree.iterparse(io.BytesIO(raw), events=("start", "end"), tag=tablas | renglones,
+                                  html=True, recover=True):
+        if el.tag in tablas:
+            depth += 1 if ev == "start" else -1
+            if ev == "end" and depth == 0 and cols.n:
+                break
+        elif ev == "end" and depth:
+            fila = []
+            for td in el:
+                if td.tag in celdas:
+                    fila.append(_texto_celda(td))
+                    if td.get("colspan") is not None:
+                        fila.extend([""] * (_colspan(td) - 1))
+            if fila:
+                cols.agregar(fila)
+            _liberar(el)
+            if cols.n == nrows:
+                break
+    return cols.frame()
+
+
+def _tabla_spreadsheetml(fuente, nrows: int = None) -> Optional[pd.DataFrame]:
+    """
+    ``ss:Row`` de la primera ``ss:Table`` en streaming (hasta ``nrows``),
+    respetando los huecos de ``ss:Index``. ``None`` si no hay renglones.
+    """
+    cols = _Columnas()
+    for _, el in etree.iterparse(fuente, events=("end",), tag=(_SS + "Row", _SS + "Table"),
+                                 recover=True, huge_tree=True):
+        if el.tag == _SS + "Table":
+            break
+        fila = []
+        for cell in el.iterchildren(_SS + "Cell"):
+            idx = cell.get(_SS + "Index")
+            if idx is not None:
+                fila.extend([""] * (int(idx) - 1 - len(fila)))
+            data_el = cell.find(_SS + "Data")
+            val = data_el.text if data_el is not None else ""
+            fila.append(val if val is not None else "")
+        cols.agregar(fila)
+        _liberar(el)
+        if cols.n == nrows:
+            break
+    return cols.frame()
+
+
+_RE_WORKBOOK = re.compile(rb"<(?:\w+:)?Workbook\b.*</(?:\w+:)?Workbook\s*>", re.DOTALL)
+
+
+def _spreadsheetml_incrustado(raw: bytes, nrows: int = None) -> Optional[pd.DataFrame]:
+    """SpreadsheetML dentro de un HTML (tal cual o escapado como texto)."""
+    if SS_NS.encode() not in raw:
+        return None
+    m = _RE_WORKBOOK.search(raw)
+    if m is None and b"&lt;" in raw:
+        m = _RE_WORKBOOK.search(html.unescape(raw.decode("utf-8", errors="ignore")).encode("utf-8"))
+    if m is None:
+        return None
+    try:
+        return _tabla_spreadsheetml(io.BytesIO(m.group(0)), nrows)
+    except etree.XMLSyntaxError:
+        return None
+
+
+def _read_excel_any(uploaded_file, nrows: int = None):
+    """
+    Carga .xlsx/.xls reales, HTML "tipo Excel" (aunque venga como .xls),
+    y Excel 2003 XML (SpreadsheetML), incluso si viene incrustado en HTML.
+    Devuelve un DataFrame SIN encabezados (header=None) y en texto; con
+    ``nrows`` solo los primeros renglones (para asomarse al encabezado).
+    """
+
+    # Normaliza a bytes
+    raw = uploaded_file.read() if hasattr(uploaded_file, "read") else uploaded_file
+    bio = io.BytesIO(raw)
+
+    head = raw[:4096]
+    head_stripped = head.lstrip().lower()
+
+    def _as_str(df: pd.DataFrame) -> pd.DataFrame:
+        return df.fillna("").astype(str)
+
+    # 1) XLSX (ZIP magic: 'PK')
+    if head.startswith(b"PK"):
+        bio.seek(0)
+        return _as_str(pd.read_excel(bio, sheet_name=0, engine="openpyxl", header=None, nrows=nrows))
+
+    # 2) XLS (CFBF/BIFF magic)
+    if head.startswith(b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1"):
+        bio.seek(0)
+        try:
+            return _as_str(pd.read_excel(bio, sheet_name=0, engine="xlrd", header=None, nrows=nrows))
+        except Exception:
+            # Último intento sin engine (por si estuviera disponible)
+            bio.seek(0)
+            return _as_str(pd.read_excel(bio, sheet_name=0, header=None, nrows=nrows))
+
+    # 3) ¿HTML (incluye .xls "disfrazado")?
+    is_html = (
+        head_stripped.startswith(b"<!doctype html")
+        or head_stripped.startswith(b"<html")
+        or (b"<table" in head_stripped[:1024])
+        or (b"xmlns:x=\"urn:schemas-microsoft-com:office:excel\"" in head)  # HTML "tipo Excel"
+    )
+    if is_html:
+        # 3.a: primera <table> (con o sin namespace), leída en streaming
+        df = _tabla_html(raw, nrows)
+        if df is not None:
+            return _as_str(df)
+
+        # 3.b: SpreadsheetML (Excel 2003 XML) incrustado en <xml>…</xml> dentro del HTML
+        df = _spreadsheetml_incrustado(raw, nrows)
+        if df is not None:
+            return _as_str(df)
+
+        raise ValueError("El archivo es HTML pero no contiene una tabla utilizable.")
+
+    # 4) SpreadsheetML (XML plano, no HTML)
+    if (b"<Workbook" in head) or (SS_NS.encode() in head):
+        df = _tabla_spreadsheetml(io.BytesIO(raw), nrows)
+        if df is None:
+            raise ValueError("XML SpreadsheetML sin <Worksheet>/<Table>.")
+        return _as_str(df)
+
+    # 5) Último intento con motores estándar
+    bio.seek(0)
+    try:
+        return _as_str(pd.read_excel(bio, sheet_name=0, engine="openpyxl", header=None, nrows=nrows))
+    except Exception:
+        bio.seek(0)
+        return _as_str(pd.read_excel(bio, sheet_name=0, engine="xlrd", header=None, nrows=nrows))
+
+# =====================================================
+# --- DETECCIÓN DEL MODO ---
+# =====================================================
+
+# Renglones que se leen para decidir el modo de un archivo (el encabezado se
+# busca en los primeros 12)
+FILAS_ENCABEZADO = 15
+
+
+def _detect_mode(df_raw: pd.DataFrame) -> Optional[str]:
+    """
+    Detecta STAR 1 o STAR 2.0 por encabezados o contenido A2. ``None`` si no
+    hay encabezado de ninguno de los dos.
+    """
+    try:
+        df_guess, _ = _guess_header(df_raw.copy())
+    except Exception:
+        df_guess = df_raw.copy()
+
+    cols_norm = [str(c).strip().lower().replace("\xa0", " ") for c in df_guess.columns]
+
+    if any(c == "poliza" for c in cols_norm):
+        return "star2"
+
+    if len(df_guess.index) >= 1 and len(df_guess.columns) >= 1:
+        a2 = str(df_guess.iloc[0, 0] if df_guess.shape[1] > 0 else "")
+        if a2.replace("\xa0", " ").strip().startswith(":"):
+            return "star2"
+
+    header_join = " ".join(cols_norm)
+    if ("poliza" in header_join and "concepto" in header_join) or ("poliza" in header_join and "fecha" in header_join):
+        return "star2"
+
+    if _fila_encabezado(df_raw) is not None:
+        return "star1"
+    return None
+
+
+def detectar_modo(contenido: bytes) -> Optional[str]:
+    """Modo de un archivo leyendo solo sus primeros ``FILAS_ENCABEZADO`` renglones."""
+    return _detect_mode(_read_excel_any(contenido, nrows=FILAS_ENCABEZADO))
+
+
+def _fila_encabezado(df) -> Optional[int]:
+    """Índice del renglón de encabezados (STAR 1 o STAR 2.0) en los primeros 12."""
+    for i in range(min(12, len(df))):
+        row_vals = df.iloc[i].astype(str).str.replace("\xa0", " ", regex=False).str.strip().tolist()
+        row_join = " ".join([v for v in row_vals if v and v.lower() != "nan"])
+
+        if re.search(r"cuenta.*concepto", row_join, re.IGNORECASE) and re.search(
+            r"(saldo|cargos|abonos)", row_join, re.IGNORECASE
+        ):
+            return i
+
+        if re.search(r"\bpoliza\b", row_join, re.IGNORECASE) and re.search(
+            r"\b(concepto|fecha|saldo|cargos|abonos)\b", row_join, re.IGNORECASE
+        ):
+            return i
+    return None
+
+
+def _guess_header(df):
+    """Encuentra la fila de encabezados tanto para STAR 1 como STAR 2.0."""
+    header_idx = _fila_encabezado(df)
+
+    if header_idx is not None:
+        new_cols = df.iloc[header_idx].astype(str).str.replace("\xa0", " ", regex=False).str.strip().tolist()
+        new_cols = [c if c and c.lower() != "nan" else f"col{j}" for j, c in enumerate(new_cols)]
+        df2 = df.iloc[header_idx + 1:].reset_index(drop=True)
+        df2.columns = new_cols[: df2.shape[1]]
+        return df2, list(df2.columns)
+
+    base_cols = ["Cuenta / Concepto", "Cheque", "Trafico", "Factura", "Fecha", "Cargos", "Abonos", "Saldo"]
+    cols = base_cols + [f"col{j}" for j in range(len(base_cols), df.shape[1])]
+    df2 = df.copy()
+    df2.columns = cols[: df.shape[1]]
+    return df2, list(df2.columns)
+
+
+# =====================================================
+# --- STAR 2.0 ---
+# =====================================================
+
+def process_star2_single(df_raw: pd.DataFrame) -> pd.DataFrame:
+    df, _ = _guess_header(df_raw.copy())
+
+    def _norm_name(c: str) -> str:
+        s = str(c).strip().replace("\xa0", " ")
+        s_l = re.sub(r"\s+", " ", s.lower())
+        if s_l == "poliza":    return "Poliza"
+        if s_l == "concepto":  return "Concepto"
+        if "cliente" in s_l and "proveedor" in s_l: return "Cliente / Proveedor"
+        if "sucursal" in s_l or s_l in ("suc", "suc."): return "Sucursal"
+        if s_l == "cheque":    return "Cheque"
+        if s_l in ("trafico", "tráfico"): return "Trafico"
+        if s_l == "factura":   return "Factura"
+        if s_l == "fecha":     return "Fecha"
+        if s_l == "cargos":    return "Cargos"
+        if s_l == "abonos":    return "Abonos"
+        if s_l == "saldo":     return "Saldo"
+        return s
+
+    df = df.rename(columns={c: _norm_name(c) for c in df.columns})
+
+    # Asegurar columna Cuenta
+    if "Cuenta" not in df.columns:
+        df.insert(0, "Cuenta", "")
+
+    # ✅ NUEVO: detectar encabezados "Cuenta: ...." dentro del mismo archivo y propagar por bloque
+    cuenta_col = "Poliza" if "Poliza" in df.columns else df.columns[0]
+
+    cuenta_re = r"^\s*(cuenta\s*:)\s*(.+)$"
+    # Formato típico: 200-03-99-001-02850 ...
+    acct_code_re = r"^\s*\d{3}-\d{2}-\d{2}-\d{3}-\d{5}\b.*"
+
+    # Todo por columnas: máscaras de inicio/fin de bloque y ffill de la cuenta
+    text = _texto(df[cuenta_col])
+    es_cuenta = por_valor(text, lambda u: u.str.match(cuenta_re, flags=re.IGNORECASE)).astype(bool)
+
+    # Por si alguna vez llega SIN "Cuenta:" pero con el código al inicio y sin otros datos
+    otros_vacios = pd.Series(True, index=df.index)
+    for j, c in enumerate(df.columns):
+        if c != cuenta_col:
+            otros_vacios &= por_valor(df.iloc[:, j], _vacio).astype(bool)
+    es_codigo = (
+        ~es_cuenta & otros_vacios
+        & por_valor(text, lambda u: u.str.match(acct_code_re, flags=re.IGNORECASE)).astype(bool)
+    )
+
+    inicio = es_cuenta | es_codigo
+    if "Fecha" in df.columns:
+        es_total = ~inicio & por_valor(df["Fecha"], lambda u: _limpia(u).str.lower().eq("total")).astype(bool)
+    else:
+        es_total = pd.Series(False, index=df.index)
+
+    # Cada inicio abre bloque con su cuenta; cada "Total" lo cierra (""); ffill = cuenta vigente
+    nombre = text[es_cuenta].str.extract(cuenta_re, flags=re.IGNORECASE)[1].str.strip()
+    evento = pd.Series(None, index=df.index, dtype=object)
+    evento[es_cuenta] = nombre
+    evento[es_codigo] = text[es_codigo]
+    evento[es_total] = ""
+    vigente = evento.ffill().fillna("")
+    en_bloque = vigente.ne("")
+
+    # Solo el "Total" que cierra un bloque abierto se elimina aquí
+    cierra = es_total & en_bloque.shift(fill_value=False)
+    asigna = en_bloque & ~inicio & ~es_total
+    df.loc[asigna, "Cuenta"] = vigente[asigna]
+
+    df = df.loc[~(inicio | cierra)].reset_index(drop=True)
+
+    # Eliminar filas-resumen (Total / Saldo inicial / etc.)
+    df = _drop_summary_rows(df)
+
+    # Filtrar conceptos vacíos
+    if "Concepto" in df.columns:
+        df = df[df["Concepto"].astype(str).str.strip().ne("")]
+
+    # Montos a numérico
+    for col in ["Cargos", "Abonos", "Saldo"]:
+        if col in df.columns:
+            df[col] = _to_num_col(df[col])
+
+    # Mantener filas con algún monto (si existen columnas de monto)
+    amt_cols = [c for c in ["Cargos", "Abonos", "Saldo"] if c in df.columns]
+    if amt_cols:
+        df = df[df[amt_cols].fillna(0).abs().sum(axis=1) > 0].reset_index(drop=True)
+
+    desired = ["Cuenta", "Poliza", "Concepto", "Cliente / Proveedor", "Sucursal",
+               "Cheque", "Trafico", "Factura", "Fecha", "Cargos", "Abonos", "Saldo"]
+    ordered = [c for c in desired if c in df.columns]
+    rest = [c for c in df.columns if c not in ordered]
+    return df[ordered + rest]
+
+
+# =====================================================
+# --- STAR 1 ---
+# =====================================================
+
+def process_report(df_raw):
+    """
+    STAR 1: limpia encabezados/sumarios, propaga Cuenta,
+    normaliza montos y FECHA (dd/mm/yyyy).
+    """
+    df = df_raw.copy()
+
+    if len(df) > 0:
+        df = df.iloc[1:].reset_index(drop=True)
+
+    df, _ = _guess_header(df)
+
+    if "Cuenta" not in df.columns:
+        df.insert(0, "Cuenta", "")
+
+    def find_col(pat, default=None):
+        for c in df.columns:
+            if re.search(pat, str(c), re.IGNORECASE):
+                return c
+        return default
+
+    col_cc     = find_col(r"cuenta.*concepto", df.columns[1] if len(df.columns) > 1 else df.columns[0])
+    col_cheque = find_col(r"cheq")
+    col_traf   = find_col(r"traf")
+    col_fact   = find_col(r"fact")
+    col_cargos = find_col(r"cargos")
+    col_abonos = find_col(r"abonos")
+    col_saldo  = find_col(r"saldo")
+
+    cuenta_pat = r"^\s*\d{3}-\d{2}-\d{2}-\d{3}-\d{2}-\d{3}-\d{4}\s+-\s+.+"
+
+    # Renglones de cuenta -> se eliminan y su texto se propaga hacia abajo (ffill)
+    text = _texto(df[col_cc])
+    es_cuenta = por_valor(text, lambda u: u.str.match(cuenta_pat, flags=re.IGNORECASE)).astype(bool)
+
+    # 'Saldo' / 'Sumas totales' sin cheque/tráfico/factura -> fuera
+    is_summary_word = por_valor(text, lambda u: u.str.lower().isin({"saldo", "sumas totales"})).astype(bool)
+    has_detail_refs = pd.Series(False, index=df.index)
+    for c in [col_cheque, col_traf, col_fact]:
+        if c:
+            has_detail_refs |= ~por_valor(df[c], _vacio).astype(bool)
+    es_sumario = ~es_cuenta & is_summary_word & ~has_detail_refs
+
+    df["Cuenta"] = text.where(es_cuenta).ffill().fillna("__SIN_CUENTA_DETECTADA__")
+    df = df.loc[~(es_cuenta | es_sumario)].reset_index(drop=True)
+    # 🔴 EXTRA: eliminar 'Sumas Totales / Suma Total / Saldo(s)' si aparecen en otras columnas (p.ej. 'Fecha')
+    df = _drop_summary_rows(df)  # <-- NUEVO
+
+    for col in [col_cargos, col_abonos, col_saldo]:
+        if col:
+            df[col] = _to_num_col(df[col])
+
+    for c in df.columns:
+        if re.search(r"fecha", str(c), re.IGNORECASE):
+            df[c] = fecha_texto(df[c])
+
+    amt_cols = [c for c in [col_cargos, col_abonos, col_saldo] if c]
+    if amt_cols:
+        for c in amt_cols:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+        if col_cc in df.columns:
+            df = df[por_valor(df[col_cc], lambda u: u.astype(str).str.strip().ne("")).astype(bool)]
+        df = df[df[amt_cols].fillna(0).abs().sum(axis=1) > 0].reset_index(drop=True)
+
+    # Renglones sin nada fuera de "Cuenta" (una máscara por columna, por valor único)
+    def _celda_vacia(u):
+        return _limpia(u).str.lower().isin({"", "nan", "none"})
+
+    vacio = pd.Series(True, index=df.index)
+    for j, c in enumerate(df.columns):
+        if c != "Cuenta":
+            vacio &= por_valor(df.iloc[:, j], _celda_vacia).astype(bool)
+    df = df.loc[~vacio].reset_index(drop=True)
+
+    first_cols = ["Cuenta"]
+    rest = [c for c in df.columns if c not in first_cols]
+    return df[first_cols + rest]
+
+
+# =====================================================
+# --- VARIOS ARCHIVOS EN PARALELO ---
+# =====================================================
+
+LIMPIADORES = {"star1": process_report, "star2": process_star2_single}
+
+
+@lru_cache(maxsize=1)
+def version_limpieza() -> str:
+    """Hash del código que limpia (este módulo y ``normaliza``): cambia la llave del cache al editarlo."""
+    fuentes = (Path(__file__), Path(normaliza.__file__))
+    return hashlib.sha256(b"".join(f.read_bytes() for f in fuentes)).hexdigest()[:16]
+
+
+def _procesar_archivo(args) -> Tuple[int, Optional[pd.DataFrame], Optional[str], Optional[str]]:
+    i, contenido, modo = args
+    try:
+        if modo is None:
+            # Se decide con el encabezado; si no se reconoce, no se lee completo
+            modo = detectar_modo(contenido)
+            if modo is None:
+                return i, None, "No se reconoce el encabezado de STAR 1 ni de STAR 2.0.", None
+        return i, LIMPIADORES[modo](_read_excel_any(contenido)), None, modo
+    except Exception as e:
+        return i, None, str(e), modo
+
+
+def procesar_archivos(
+    archivos: Sequence[Tuple[str, bytes]],
+    modo: str = None,
+    max_workers: int = None,
+    avance: Callable[[int, int, str, Optional[str], bool], None] = None,
+    cache: Optional[CacheParquet] = None,
+) -> Tuple[pd.DataFrame, Dict[str, str], Dict[str, str], List[str]]:
+    """
+    Lee y limpia ``[(nombre, bytes), ...]`` con el limpiador de ``modo``
+    (``"star1"`` / ``"star2"``; ``None`` = detectar cada archivo por su
+    encabezado, así que un lote puede mezclar STAR 1 y STAR 2.0).
+
+    Con ``cache``, los archivos ya limpiados antes (mismos bytes, modo y
+    versión del código) se toman de ahí y los demás se guardan al terminar.
+    Cada archivo restante se procesa en un proceso aparte; ``avance(hechos,
+    total, nombre, error, de_cache)`` se llama conforme termina cada uno.
+    Regresa ``(df_clean, modos, errores, de_cache)``: ``modos[nombre]`` es el
+    limpiador usado; los archivos que fallan quedan fuera de ``df_clean``
+    (concatenado en el orden original) y su mensaje en ``errores[nombre]``;
+    ``de_cache`` son los nombres que salieron del cache.
+    """
+    if not archivos:
+        return pd.DataFrame(), {}, {}, []
+
+    total = len(archivos)
+    salidas: List[Optional[pd.DataFrame]] = [None] * total
+    modos: Dict[str, str] = {}
+    errores: Dict[str, str] = {}
+    de_cache: List[str] = []
+    llaves = [llave_cache(contenido, modo or "auto", version_limpieza()) if cache else None
+              for _, contenido in archivos]
+    hechos = 0
+
+    def _registrar(i, df, err, modo_archivo, desde_cache=False):
+        nonlocal hechos
+        hechos += 1
+        nombre = archivos[i][0]
+        salidas[i] = df
+        if modo_archivo is not None:
+            modos[nombre] = modo_archivo
+        if err is not None:
+            errores[nombre] = err
+        elif desde_cache:
+            de_cache.append(nombre)
+        elif cache:
+            cache.guardar(llaves[i], df, modo=modo_archivo)
+        if avance:
+            avance(hechos, total, nombre, err, desde_cache)
+
+    tareas = []
+    for i, (_, contenido) in enumerate(archivos):
+        previo = cache.leer(llaves[i]) if cache else None
+        if previo is not None:
+            modo_previo = previo.attrs.pop("modo", modo)
+            _registrar(i, previo, None, modo_previo, desde_cache=True)
+        else:
+            tareas.append((i, contenido, modo))
+
+    workers = min(len(tareas), max_workers or os.cpu_count() or 1)
+    if len(tareas) < MIN_ARCHIVOS_PARALELO or workers < 2:
+        for t in tareas:
+            _registrar(*_procesar_archivo(t))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futuros = [ex.submit(_procesar_archivo, t) for t in tareas]
+            for fut in as_completed(futuros):
+                _registrar(*fut.result())
+
+    dfs = [df for df in salidas if df is not None]
+    df_clean = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+    return df_clean, modos, errores, de_cache
+
+
+# =====================================================
+# --- EXPORTACIÓN ---
+# =====================================================
+
+# Renglones de datos por hoja (el límite de Excel menos el encabezado)
+FILAS_POR_HOJA = 1_048_576 - 1
+# Renglones que se convierten a objetos Python a la vez al escribir el Excel
+BLOQUE_EXCEL = 50_000
+
+
+def exportar_excel(df: pd.DataFrame, hoja: str = "REPORTE", filas_por_hoja: int = FILAS_POR_HOJA) -> bytes:
+    """
+    Excel con xlsxwriter en ``constant_memory``: cada renglón se escribe en
+    orden y se baja a disco, así que la memoria no crece con el libro. Si no
+    cabe en una hoja se parte en ``REPORTE_1``, ``REPORTE_2``, …
+
+    Las fechas (columnas datetime64) salen como fecha de Excel con formato
+    ``yyyy-mm-dd`` (``yyyy-mm-dd hh:mm:ss`` si alguna trae hora), no como serial.
+    """
+    import xlsxwriter
+
+    col_fechas = [j for j, c in enumerate(df.columns) if pd.api.types.is_datetime64_any_dtype(df[c])]
+    con_hora = any((df.iloc[:, j].dropna().dt.normalize() != df.iloc[:, j].dropna()).any() for j in col_fechas)
+    formato_fecha = "yyyy-mm-dd hh:mm:ss" if con_hora else "yyyy-mm-dd"
+
+    buffer = io.BytesIO()
+    # write_row manda los Timestamp a write_datetime, que usa default_date_format
+    wb = xlsxwriter.Workbook(buffer, {"constant_memory": True, "strings_to_numbers": False,
+                                      "strings_to_formulas": False, "strings_to_urls": False,
+                                      "default_date_format": formato_fecha, "remove_timezone": True})
+    encabezado = [str(c) for c in df.columns]
+    negritas = wb.add_format({"bold": True})
+
+    n_hojas = max(1, -(-len(df) // filas_por_hoja))
+    for h in range(n_hojas):
+        ws = wb.add_worksheet(hoja if n_hojas == 1 else f"{hoja}_{h + 1}")
+        for j in col_fechas:  # ancho suficiente para que no salga '#####'
+            ws.set_column(j, j, len(formato_fecha) + 2)
+        ws.write_row(0, 0, encabezado, negritas)
+        fila = 1
+        fin = min((h + 1) * filas_por_hoja, len(df))
+        for ini in range(h * filas_por_hoja, fin, BLOQUE_EXCEL):
+            bloque = df.iloc[ini:min(ini + BLOQUE_EXCEL, fin)]
+            # NaN/None -> celda vacía (xlsxwriter no escribe NaN)
+            bloque = bloque.astype(object).where(bloque.notna(), None)
+            for valores in bloque.itertuples(index=False, name=None):
+                ws.write_row(fila, 0, valores)
+                fila += 1
+    wb.close()
+    return buffer.getvalue()
+
+
+def exportar_csv_gz(df: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False, encoding="utf-8", compression={"method": "gzip"})
+    return buffer.getvalue()
+
+
+def exportar_parquet(df: pd.DataFrame) -> bytes:
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+# etiqueta -> (función, nombre de archivo, mime)
+FORMATOS_EXPORTACION = {
+    "Excel (.xlsx)": (exportar_excel, "Reporte_procesado.xlsx",
+                      "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV comprimido (.csv.gz)": (exportar_csv_gz, "Reporte_procesado.csv.gz", "application/gzip"),
+    "Parquet (.parquet)": (exportar_parquet, "Reporte_procesado.parquet", "application/vnd.apache.parquet"),
+}
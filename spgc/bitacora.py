@@ -0,0 +1,200 @@
+"""
+Bitácora local (SQLite) de facturas ya consolidadas, por UUID del CFDI.
+
+Los lectores de XML y PDF guardan aquí las filas que generó cada factura
+(``fuente`` = "xml" / "pdf", porque las columnas de cada lector son
+distintas). En la siguiente carga, las facturas cuyo UUID ya está en la
+bitácora se toman de aquí sin volver a leerlas, y el historial completo se
+puede exportar directo desde la base.
+
+El UUID de un XML se saca con un vistazo a los bytes (``cfdi.uuid_rapido``);
+el de un PDF solo aparece después de extraer el texto, así que además se
+guarda el SHA-256 de cada PDF ya leído y su UUID (tabla ``archivos``).
+
+Cada factura guarda la ``version`` del lector que la generó (hash de su
+código, como ``version_limpieza``): si el lector cambió, ``buscar`` no la
+encuentra y se vuelve a leer. Las filas se guardan como JSON: la ruta viene
+de una variable de entorno y leer la base no debe poder ejecutar nada. Si
+la base ya tiene tablas ``facturas`` / ``archivos`` con otras columnas, no
+se modifican: se lanza ``ValueError``.
+
+La base vive en ``SPGC_BITACORA`` o, por default, junto al cache en disco.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from spgc.cache import CARPETA_DEFAULT
+
+RUTA_DEFAULT = Path(os.getenv("SPGC_BITACORA", CARPETA_DEFAULT / "facturas.sqlite"))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS facturas (
+    fuente  TEXT NOT NULL,
+    uuid    TEXT NOT NULL,
+    archivo TEXT,
+    formato TEXT,
+    version TEXT NOT NULL,
+    filas   TEXT NOT NULL,
+    debug   TEXT,
+    alta    TEXT NOT NULL,
+    vistas  INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (fuente, uuid)
+);
+CREATE TABLE IF NOT EXISTS archivos (
+    fuente TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    uuid   TEXT NOT NULL,
+    PRIMARY KEY (fuente, sha256)
+);
+"""
+_COLUMNAS = {
+    "facturas": {"fuente", "uuid", "archivo", "formato", "version", "filas", "debug", "alta", "vistas"},
+    "archivos": {"fuente", "sha256", "uuid"},
+}
+
+
+class Registro(NamedTuple):
+    uuid: str
+    archivo: str
+    formato: str
+    filas: List[Dict[str, object]]
+    debug: Dict[str, object]
+    alta: str
+
+
+def sha256_de(contenido: bytes) -> str:
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def _llave(uuid: str) -> str:
+    return (uuid or "").strip().upper()
+
+
+def _a_json(valor):
+    # Decimal (CANTIDAD del XML) se marca para volver como Decimal; escalares numpy -> Python
+    if isinstance(valor, Decimal):
+        return {"$decimal": str(valor)}
+    if hasattr(valor, "item"):
+        return valor.item()
+    raise TypeError(f"{type(valor).__name__} no se puede guardar en la bitácora")
+
+
+def _de_json(obj: dict):
+    return Decimal(obj["$decimal"]) if obj.keys() == {"$decimal"} else obj
+
+
+def _dumps(valor) -> str:
+    return json.dumps(valor, default=_a_json, ensure_ascii=False)
+
+
+def _loads(texto: Optional[str]):
+    return json.loads(texto, object_hook=_de_json) if texto else None
+
+
+class BitacoraUUID:
+    """
+    ``version`` identifica al lector que llena esta bitácora: las facturas
+    guardadas con otra versión cuentan como no encontradas en ``buscar``.
+
+    Una instancia puede compartirse entre sesiones (``st.cache_resource``):
+    cada consulta / transacción toma un candado, así no se mezclan entre hilos.
+    """
+
+    def __init__(self, ruta: Path = None, version: str = ""):
+        ruta = Path(ruta or RUTA_DEFAULT)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.version = version
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(ruta, check_same_thread=False)
+        # CREATE IF NOT EXISTS respetaría una tabla ajena con el mismo nombre: no se toca, se avisa
+        for tabla, esperadas in _COLUMNAS.items():
+            columnas = {c[1] for c in self._con.execute(f"PRAGMA table_info({tabla})")}
+            if columnas and columnas != esperadas:
+                self._con.close()
+                raise ValueError(
+                    f"{ruta}: la tabla '{tabla}' no tiene las columnas de la bitácora "
+                    f"({', '.join(sorted(columnas))}); usa otra ruta en SPGC_BITACORA"
+                )
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.executescript(_ESQUEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
+
+    def buscar(self, fuente: str, uuid: str) -> Optional[Registro]:
+        with self._lock:
+            fila = self._con.execute(
+                "SELECT uuid, archivo, formato, filas, debug, alta FROM facturas "
+                "WHERE fuente = ? AND uuid = ? AND version = ?",
+                (fuente, _llave(uuid), self.version),
+            ).fetchone()
+        if fila is None:
+            return None
+        uuid, archivo, formato, filas, debug, alta = fila
+        return Registro(uuid, archivo, formato, _loads(filas), _loads(debug) or {}, alta)
+
+    def marcar_vistas(self, fuente: str, uuids: Iterable[str]) -> None:
+        with self._lock, self._con:
+            self._con.executemany(
+                "UPDATE facturas SET vistas = vistas + 1 WHERE fuente = ? AND uuid = ?",
+                [(fuente, _llave(u)) for u in uuids],
+            )
+
+    def guardar(self, fuente: str, registros: Iterable[Tuple[str, str, str, List[Dict[str, object]], Dict[str, object]]]) -> int:
+        """
+        ``[(uuid, archivo, formato, filas, debug), ...]`` en una transacción, con la
+        ``version`` de esta bitácora; un UUID que ya estaba se reemplaza (reproceso).
+        Los sin UUID se ignoran.
+        """
+        alta = datetime.now().isoformat(timespec="seconds")
+        datos = [
+            (fuente, _llave(uuid), archivo, formato, self.version, _dumps(filas), _dumps(debug), alta)
+            for uuid, archivo, formato, filas, debug in registros
+            if _llave(uuid)
+        ]
+        with self._lock, self._con:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO facturas (fuente, uuid, archivo, formato, version, filas, debug, alta) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                datos,
+            )
+        return len(datos)
+
+    def uuid_de_archivo(self, fuente: str, sha256: str) -> Optional[str]:
+        with self._lock:
+            fila = self._con.execute(
+                "SELECT uuid FROM archivos WHERE fuente = ? AND sha256 = ?", (fuente, sha256)
+            ).fetchone()
+        return fila[0] if fila else None
+
+    def guardar_archivo(self, fuente: str, sha256: str, uuid: str) -> None:
+        if not _llave(uuid):
+            return
+        with self._lock, self._con:
+            self._con.execute(
+                "INSERT OR REPLACE INTO archivos (fuente, sha256, uuid) VALUES (?, ?, ?)",
+                (fuente, sha256, _llave(uuid)),
+            )
+
+    def total(self, fuente: str) -> int:
+        with self._lock:
+            return self._con.execute("SELECT COUNT(*) FROM facturas WHERE fuente = ?", (fuente,)).fetchone()[0]
+
+    def filas(self, fuente: str) -> List[Dict[str, object]]:
+        """Todas las filas consolidadas de ``fuente``, en el orden en que entraron."""
+        with self._lock:
+            guardadas = self._con.execute(
+                "SELECT filas FROM facturas WHERE fuente = ? ORDER BY alta, rowid", (fuente,)
+            ).fetchall()
+        out: List[Dict[str, object]] = []
+        for (filas,) in guardadas:
+            out.extend(_loads(filas))
+        return out
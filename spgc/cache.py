@@ -0,0 +1,93 @@
+"""
+Cache en disco de DataFrames en Parquet, llaveado por contenido.
+
+La llave es el SHA-256 de los bytes del archivo subido más lo que cambie el
+resultado (modo de limpieza, versión del código). Cada entrada es un
+``<llave>.parquet`` en ``carpeta``; al leer se le actualiza la fecha de
+modificación y, al guardar, se borran las menos usadas (LRU por ``mtime``)
+hasta quedar debajo de ``max_bytes``.
+
+La carpeta se puede cambiar con ``SPGC_CACHE_DIR`` y el tamaño con
+``SPGC_CACHE_MB``. Cualquier error de disco se trata como "no está en cache":
+el cache nunca hace fallar el procesamiento.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+CARPETA_DEFAULT = Path(os.getenv("SPGC_CACHE_DIR", Path.home() / ".cache" / "spgc"))
+MB_DEFAULT = int(os.getenv("SPGC_CACHE_MB", "512"))
+
+
+def llave_cache(contenido: bytes, *partes) -> str:
+    h = hashlib.sha256(contenido)
+    for p in partes:
+        h.update(b"\x00")
+        h.update(str(p).encode("utf-8"))
+    return h.hexdigest()
+
+
+class CacheParquet:
+    def __init__(self, nombre: str, carpeta: Path = None, max_bytes: int = None):
+        self.carpeta = Path(carpeta or CARPETA_DEFAULT) / nombre
+        self.max_bytes = MB_DEFAULT * 1024 * 1024 if max_bytes is None else max_bytes
+
+    def _ruta(self, llave: str) -> Path:
+        return self.carpeta / f"{llave}.parquet"
+
+    def leer(self, llave: str) -> Optional[pd.DataFrame]:
+        """La entrada guardada (con lo que se dio en ``meta`` en ``df.attrs``) o None."""
+        ruta = self._ruta(llave)
+        try:
+            df = pd.read_parquet(ruta)
+            os.utime(ruta)  # más reciente para el LRU
+            return df
+        except Exception:
+            return None
+
+    def guardar(self, llave: str, df: pd.DataFrame, **meta) -> bool:
+        """
+        Escribe la entrada (atómico: temporal + rename) y aplica el límite de
+        tamaño. ``meta`` (valores simples) viaja en los metadatos del Parquet.
+        """
+        if meta:
+            df = df.copy(deep=False)
+            df.attrs = dict(meta)
+        try:
+            self.carpeta.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.carpeta, suffix=".tmp")
+            os.close(fd)
+            try:
+                df.to_parquet(tmp, index=False)
+                os.replace(tmp, self._ruta(llave))
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        except Exception:
+            return False
+        self._recortar()
+        return True
+
+    def _recortar(self) -> None:
+        entradas = []
+        for ruta in self.carpeta.glob("*.parquet"):
+            try:
+                info = ruta.stat()
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, ruta))
+
+        total = sum(tam for _, tam, _ in entradas)
+        for _, tam, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            try:
+                ruta.unlink()
+            except OSError:
+                continue
+            total -= tam
+
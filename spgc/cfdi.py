@@ -0,0 +1,646 @@
+"""
+Lectura de facturas XML CFDI (Lector XML).
+
+``parse_xml_bytes`` detecta el proveedor (K9, ROYAN, WASH N CROSS o SAT
+genérico) y regresa las partidas de cada XML. El árbol se recorre una vez
+(``CfdiIndex``). ``procesar_documentos`` reparte lotes de XML en procesos
+aparte; los XML pueden venir sueltos o dentro de un .zip / .tar.gz, que se
+leen en memoria sin extraer a disco (``documentos_de``). ``uuid_rapido``
+saca el UUID sin leer el XML completo (para la bitácora de facturas).
+
+Los CFDI 3.3 y 4.0 se leen con lxml y XPath precompilado por versión
+(``CfdiIndexLxml``); cualquier otro esquema, o si no está lxml, va por
+``ElementTree`` + ``CfdiIndex``. Los parsers solo ven la interfaz común.
+Los dos índices dan lo mismo: Emisor y Receptor son hijos de la raíz y
+Concepto solo cuenta dentro de Conceptos (uno con ese nombre en la Addenda
+no es partida); el TimbreFiscalDigital se busca primero en el Complemento
+y, si no está ahí, en cualquier parte; los Traslado de un Concepto son todos
+sus descendientes con ese nombre.
+"""
+import gzip
+import hashlib
+import io
+import os
+import re
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+try:
+    from lxml import etree as LET
+except ModuleNotFoundError:  # sin lxml todo va por ElementTree
+    LET = None
+
+FINAL_COLUMNS = [
+    "EMPRESA", "# FACTURA", "UUID", "FECHA FACTURA", "FECHA Y HR SERVICIO REALIZADO",
+    "# DE UNIDAD", "ACTIVIDAD", "CANTIDAD", "SUBTOTAL", "IVA", "TOTAL",
+]
+
+PROVEEDORES = {
+    "K9": ["MA. DEL CARMEN BALDERAS ESCAMILLA", "MA DEL CARMEN BALDERAS ESCAMILLA", "BAEM890616HW5"],
+    "ROYAN": ["ALLAN ADRIAN NAVARRO MACIAS", "NAMA820330G3A"],
+    "WASH N CROSS": ["WASH N CROSS", "WNC070608P43"],
+}
+SAT_GENERICO = "SAT GENERICO"
+
+
+def D(value, default="0") -> Decimal:
+    if value is None or value == "":
+        value = default
+    try:
+        return Decimal(str(value).replace(",", "")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        return Decimal(default).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def q2(value: Decimal) -> float:
+    return float(value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+
+@lru_cache(maxsize=1)
+def version_lector() -> str:
+    """Hash de este módulo: la bitácora de UUID no reutiliza filas de otra versión del lector."""
+    with open(__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def norm(text: Optional[str]) -> str:
+    return (text or "").upper().strip()
+
+
+@lru_cache(maxsize=4096)
+def norm_key(key: str) -> str:
+    return norm(key).replace(".", "").replace("_", "").replace(" ", "")
+
+
+def local_name(tag: str) -> str:
+    return tag.split("}", 1)[-1] if "}" in tag else tag
+
+
+OBS_TAGS = {"ADDENDA", "COMPLEMENTO", "OBSERVACIONES", "COMENTARIOS"}
+OBS_ATTRS = {"OBSERVACIONES", "OBSERVACION", "COMENTARIOS", "COMENTARIO"}
+
+
+def _last_descendant(elem: ET.Element) -> ET.Element:
+    while len(elem):
+        elem = elem[-1]
+    return elem
+
+
+class CfdiIndex:
+    """
+    Un solo recorrido del arbol: elementos por nombre local (en orden de
+    documento), traslados y subarbol de cada Concepto, y el texto de
+    observaciones/addenda. Los parsers leen solo de aqui.
+    """
+
+    def __init__(self, root: ET.Element):
+        self.root = root
+        self.elements: List[ET.Element] = []
+        self.by_name: Dict[str, List[ET.Element]] = {}
+        self._traslados: Dict[ET.Element, List[ET.Element]] = {}
+        self.subtree: Dict[ET.Element, List[ET.Element]] = {}
+        obs: List[str] = []
+
+        # root.iter() es preorden: el subarbol de un Concepto es contiguo y
+        # termina en su ultimo descendiente
+        abiertos: List[Tuple[ET.Element, ET.Element]] = []
+        for elem in root.iter():
+            ln = local_name(elem.tag)
+            self.elements.append(elem)
+            self.by_name.setdefault(ln, []).append(elem)
+
+            if ln == "Concepto":
+                abiertos.append((elem, _last_descendant(elem)))
+                self._traslados[elem] = []
+                self.subtree[elem] = []
+            for concepto, _ in abiertos:
+                self.subtree[concepto].append(elem)
+                if ln == "Traslado":
+                    self._traslados[concepto].append(elem)
+            while abiertos and elem is abiertos[-1][1]:
+                abiertos.pop()
+
+            if ln.upper() in OBS_TAGS:
+                obs.extend([str(v) for v in elem.attrib.values()])
+                if elem.text:
+                    obs.append(elem.text)
+            for k, v in elem.attrib.items():
+                # nombres de atributo sin espacios: norm(k) == k.upper()
+                if k.upper() in OBS_ATTRS:
+                    obs.append(v)
+
+        # Emisor / Receptor / Concepto solo en su lugar del esquema, igual que las
+        # XPath de CfdiIndexLxml (un "Concepto" dentro de la Addenda no es partida)
+        hijos = list(root)
+        for nombre in ("Emisor", "Receptor"):
+            self.by_name[nombre] = [e for e in hijos if local_name(e.tag) == nombre]
+        self.by_name["Concepto"] = [
+            c for e in hijos if local_name(e.tag) == "Conceptos" for c in e if local_name(c.tag) == "Concepto"
+        ]
+
+        self.complemento_text = " ".join(obs)
+        self._all_text: Optional[str] = None
+        self._concept_attrs: Dict[ET.Element, List[Tuple[str, str]]] = {}
+
+    def first(self, name: str) -> Optional[ET.Element]:
+        found = self.by_name.get(name)
+        return found[0] if found else None
+
+    def all(self, name: str) -> List[ET.Element]:
+        return self.by_name.get(name, [])
+
+    def traslados(self, concepto: ET.Element) -> List[ET.Element]:
+        return self._traslados[concepto]
+
+    def concept_attrs(self, concepto: ET.Element) -> List[Tuple[str, str]]:
+        # (norm_key(atributo), valor) del subarbol del Concepto, una vez por concepto
+        pares = self._concept_attrs.get(concepto)
+        if pares is None:
+            pares = [(norm_key(k), v) for elem in self.subtree[concepto] for k, v in elem.attrib.items()]
+            self._concept_attrs[concepto] = pares
+        return pares
+
+    def all_text(self) -> str:
+        # solo se usa como respaldo de K9; se arma la primera vez que se pide
+        if self._all_text is None:
+            parts = []
+            for elem in self.elements:
+                parts.extend([str(v) for v in elem.attrib.values()])
+                if elem.text and elem.text.strip():
+                    parts.append(elem.text.strip())
+            self._all_text = " ".join(parts)
+        return self._all_text
+
+
+# =====================================================
+# --- RUTA RAPIDA lxml (CFDI 3.3 / 4.0) ---
+# =====================================================
+
+NS_CFDI = {"3.3": "http://www.sat.gob.mx/cfd/3", "4.0": "http://www.sat.gob.mx/cfd/4"}
+NS_TFD = "http://www.sat.gob.mx/TimbreFiscalDigital"
+
+
+def _xpaths(ns: str) -> Dict[str, "LET.XPath"]:
+    nss = {"cfdi": ns, "tfd": NS_TFD}
+    return {
+        "Emisor": LET.XPath("/cfdi:Comprobante/cfdi:Emisor", namespaces=nss),
+        "Receptor": LET.XPath("/cfdi:Comprobante/cfdi:Receptor", namespaces=nss),
+        "Concepto": LET.XPath("/cfdi:Comprobante/cfdi:Conceptos/cfdi:Concepto", namespaces=nss),
+        "TimbreFiscalDigital": LET.XPath("/cfdi:Comprobante/cfdi:Complemento/tfd:TimbreFiscalDigital", namespaces=nss),
+    }
+
+
+XPATHS = {version: _xpaths(ns) for version, ns in NS_CFDI.items()} if LET is not None else {}
+# Si la ruta estricta no encuentra nada, como ``CfdiIndex``: en cualquier lugar y namespace
+XPATHS_RESPALDO = {
+    "TimbreFiscalDigital": LET.XPath("//*[local-name()='TimbreFiscalDigital']"),
+} if LET is not None else {}
+
+_local = threading.local()
+
+
+def _parser_lxml() -> "LET.XMLParser":
+    # un parser por hilo (Streamlit corre cada sesion en su hilo)
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = LET.XMLParser(resolve_entities=False, no_network=True)
+    return parser
+
+
+class CfdiIndexLxml:
+    """
+    Misma interfaz que ``CfdiIndex`` para un CFDI 3.3/4.0 leido con lxml: cada
+    nodo se pide con su XPath precompilado y solo cuando un parser lo usa (el
+    texto de observaciones, por ejemplo, solo lo pide K9).
+    """
+
+    def __init__(self, root, xpaths: Dict[str, "LET.XPath"]):
+        self.root = root
+        self._xp = xpaths
+        self._nodos: Dict[str, list] = {}
+        self._traslados: Dict[object, list] = {}
+        self._concept_attrs: Dict[object, List[Tuple[str, str]]] = {}
+        self._complemento_text: Optional[str] = None
+        self._all_text: Optional[str] = None
+
+    def all(self, name: str) -> list:
+        nodos = self._nodos.get(name)
+        if nodos is None:
+            nodos = self._xp[name](self.root)
+            if not nodos and name in XPATHS_RESPALDO:
+                nodos = XPATHS_RESPALDO[name](self.root)
+            self._nodos[name] = nodos
+        return nodos
+
+    def first(self, name: str):
+        nodos = self.all(name)
+        return nodos[0] if nodos else None
+
+    def traslados(self, concepto) -> list:
+        t = self._traslados.get(concepto)
+        if t is None:
+            # cualquier descendiente, como CfdiIndex (no solo Impuestos/Traslados)
+            t = self._traslados[concepto] = list(concepto.iter("{*}Traslado"))
+        return t
+
+    def concept_attrs(self, concepto) -> List[Tuple[str, str]]:
+        pares = self._concept_attrs.get(concepto)
+        if pares is None:
+            pares = [(norm_key(k), v) for elem in concepto.iter(LET.Element) for k, v in elem.items()]
+            self._concept_attrs[concepto] = pares
+        return pares
+
+    @property
+    def complemento_text(self) -> str:
+        if self._complemento_text is None:
+            obs: List[str] = []
+            # sin mayusculas/minusculas en XPath 1.0 (translate() por nodo es
+            # mas lento que este recorrido); mismo criterio que CfdiIndex
+            for elem in self.root.iter(LET.Element):
+                if local_name(elem.tag).upper() in OBS_TAGS:
+                    obs.extend([str(v) for v in elem.values()])
+                    if elem.text:
+                        obs.append(elem.text)
+                # primero solo los nombres: leer valores de lxml es lo caro
+                if not OBS_ATTRS.isdisjoint([k.upper() for k in elem.keys()]):
+                    obs.extend(v for k, v in elem.items() if k.upper() in OBS_ATTRS)
+            self._complemento_text = " ".join(obs)
+        return self._complemento_text
+
+    def all_text(self) -> str:
+        if self._all_text is None:
+            parts = []
+            for elem in self.root.iter(LET.Element):
+                parts.extend([str(v) for v in elem.values()])
+                if elem.text and elem.text.strip():
+                    parts.append(elem.text.strip())
+            self._all_text = " ".join(parts)
+        return self._all_text
+
+
+def indice_lxml(xml_bytes: bytes) -> Optional[CfdiIndexLxml]:
+    """``CfdiIndexLxml`` si el XML es un CFDI 3.3/4.0; None = leerlo por ElementTree."""
+    if LET is None:
+        return None
+    try:
+        root = LET.fromstring(xml_bytes, _parser_lxml())
+    except (LET.XMLSyntaxError, ValueError):
+        return None  # el error se reporta desde la ruta ElementTree
+    version = root.get("Version")
+    if version not in NS_CFDI or root.tag != f"{{{NS_CFDI[version]}}}Comprobante":
+        return None
+    if root.getroottree().docinfo.internalDTD is not None:
+        return None  # entidades propias: ElementTree las expande, lxml no
+    return CfdiIndexLxml(root, XPATHS[version])
+
+
+def attr(elem: Optional[ET.Element], key: str, default: str = "") -> str:
+    return elem.get(key, default) if elem is not None else default
+
+
+def get_uuid(idx: CfdiIndex) -> str:
+    return attr(idx.first("TimbreFiscalDigital"), "UUID")
+
+
+_RE_TFD = re.compile(rb"<(?:[\w.-]+:)?TimbreFiscalDigital\b([^>]*)>")
+_RE_UUID_ATTR = re.compile(rb"""\sUUID\s*=\s*["']([0-9A-Fa-f-]{36})["']""")
+
+
+def uuid_rapido(xml_bytes: bytes) -> str:
+    """UUID del TimbreFiscalDigital buscado en los bytes, sin armar el arbol ("" si no se ve)."""
+    m = _RE_TFD.search(xml_bytes)
+    u = _RE_UUID_ATTR.search(m.group(1)) if m else None
+    return u.group(1).decode("ascii") if u else ""
+
+
+def get_emisor_receptor(idx: CfdiIndex) -> Tuple[Dict[str, str], Dict[str, str]]:
+    emisor = idx.first("Emisor")
+    receptor = idx.first("Receptor")
+    return (emisor.attrib if emisor is not None else {}, receptor.attrib if receptor is not None else {})
+
+
+def get_concepts(idx: CfdiIndex) -> List[ET.Element]:
+    return idx.all("Concepto")
+
+
+def get_iva_from_concept(idx: CfdiIndex, concepto: ET.Element) -> Decimal:
+    iva = Decimal("0")
+    for traslado in idx.traslados(concepto):
+        if traslado.get("Impuesto") == "002" or "IVA" in norm(traslado.get("Impuesto")):
+            iva += D(traslado.get("Importe"))
+    return iva.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def get_base_from_concept(idx: CfdiIndex, concepto: ET.Element) -> Decimal:
+    for traslado in idx.traslados(concepto):
+        if traslado.get("Base"):
+            return D(traslado.get("Base"))
+    return D(concepto.get("Importe"))
+
+
+def detect_format(idx: CfdiIndex) -> str:
+    emisor, _ = get_emisor_receptor(idx)
+    emisor_text = norm(" ".join([emisor.get("Nombre", ""), emisor.get("Rfc", "")]))
+    for formato, needles in PROVEEDORES.items():
+        if any(norm(n) in emisor_text for n in needles):
+            return formato
+    if local_name(idx.root.tag) == "Comprobante" and get_concepts(idx):
+        return SAT_GENERICO
+    return "NO DETECTADO"
+
+
+def serie_folio(root: ET.Element) -> str:
+    serie = attr(root, "Serie")
+    folio = attr(root, "Folio")
+    return f"{serie}-{folio}" if serie and folio else (folio or serie)
+
+
+def common_header(idx: CfdiIndex) -> Dict[str, str]:
+    emisor, receptor = get_emisor_receptor(idx)
+    root = idx.root
+    return {
+        "empresa": receptor.get("Nombre", ""),
+        "folio": attr(root, "Folio"),
+        "serie_folio": serie_folio(root),
+        "uuid": get_uuid(idx),
+        "fecha": attr(root, "Fecha"),
+        "emisor_nombre": emisor.get("Nombre", ""),
+    }
+
+
+def extract_order_k9(text: str) -> str:
+    m = re.search(r"ORDEN\s+K9\s*[-:]?\s*(\d+)", text, flags=re.I)
+    return f"K9 {m.group(1)}" if m else ""
+
+
+def extract_service_datetime_k9(text: str) -> str:
+    m = re.search(r"SERVICIO\s+REALIZADO\s+(.+?)(?:\s+CAJA|\s+TRACTOR|\s+CAMION|$)", text, flags=re.I)
+    return m.group(1).strip() if m else ""
+
+
+def extract_unit_k9(text: str) -> str:
+    m = re.search(r"\b(CAJA|TRACTOR|CAMION)\s+([^\s]+)", text, flags=re.I)
+    return m.group(2).strip() if m else ""
+
+
+def unit_from_description_after_colon(descripcion: str) -> str:
+    if ":" not in descripcion:
+        return ""
+    value = descripcion.rsplit(":", 1)[-1].strip()
+    return re.split(r"\s+", value)[0].strip(".,;:")
+
+
+def make_row(empresa, factura, uuid, fecha, fecha_servicio, unidad, actividad, cantidad, subtotal, iva) -> Dict[str, object]:
+    subtotal = D(subtotal)
+    iva = D(iva)
+    return {
+        "EMPRESA": empresa,
+        "# FACTURA": factura,
+        "UUID": uuid,
+        "FECHA FACTURA": fecha,
+        "FECHA Y HR SERVICIO REALIZADO": fecha_servicio,
+        "# DE UNIDAD": unidad,
+        "ACTIVIDAD": actividad,
+        "CANTIDAD": cantidad,
+        "SUBTOTAL": q2(subtotal),
+        "IVA": q2(iva),
+        "TOTAL": q2(subtotal + iva),
+    }
+
+
+def concept_custom_value(idx: CfdiIndex, concepto: ET.Element, keys: List[str]) -> str:
+    wanted = [norm_key(k) for k in keys]
+    for nk, v in idx.concept_attrs(concepto):
+        if any(w in nk for w in wanted):
+            return v
+    return ""
+
+
+def parse_k9(idx: CfdiIndex) -> Tuple[List[Dict[str, object]], str]:
+    h = common_header(idx)
+    text = idx.complemento_text or idx.all_text()
+    factura = extract_order_k9(text) or h["folio"] or h["serie_folio"]
+    fecha_serv = extract_service_datetime_k9(text)
+    unidad = extract_unit_k9(text)
+    rows = []
+    for c in get_concepts(idx):
+        subtotal = D(c.get("Importe"))
+        iva = get_iva_from_concept(idx, c) or subtotal * Decimal("0.08")
+        rows.append(make_row(h["empresa"], factura, h["uuid"], h["fecha"], fecha_serv, unidad,
+                             c.get("Descripcion", ""), D(c.get("Cantidad")), subtotal, iva))
+    msg = ""
+    if not (extract_order_k9(text) and fecha_serv and unidad):
+        msg = "XML procesado, pero no trae comentarios K9 (orden/unidad/servicio); esos datos solo aparecen en el PDF si el proveedor no los incluye en Addenda."
+    return rows, msg
+
+
+def parse_royan(idx: CfdiIndex) -> Tuple[List[Dict[str, object]], str]:
+    h = common_header(idx)
+    rows = []
+    for c in get_concepts(idx):
+        subtotal = D(c.get("Importe"))
+        iva = get_iva_from_concept(idx, c) or subtotal * Decimal("0.16")
+        rows.append(make_row(h["empresa"], h["folio"] or h["serie_folio"], h["uuid"], h["fecha"], "", "",
+                             c.get("Descripcion", ""), Decimal("1"), subtotal, iva))
+    return rows, "XML ROYAN procesado; el detalle de hoja 2 no viene en este XML, solo viene el concepto fiscal resumido."
+
+
+def parse_wash(idx: CfdiIndex) -> Tuple[List[Dict[str, object]], str]:
+    h = common_header(idx)
+    rows = []
+    missing_ref_obs = False
+    for c in get_concepts(idx):
+        subtotal = D(c.get("Importe"))
+        iva = get_iva_from_concept(idx, c) or subtotal * Decimal("0.08")
+        ref_pago = concept_custom_value(idx, c, ["REFPAGO", "REF PAGO", "REF.PAGO", "REFERENCIA PAGO"])
+        obs = concept_custom_value(idx, c, ["OBS", "OBSERVACION", "OBSERVACIONES", "FECHA SERVICIO"])
+        if not ref_pago or not obs:
+            missing_ref_obs = True
+        rows.append(make_row(h["empresa"], h["serie_folio"], h["uuid"], h["fecha"], obs, ref_pago,
+                             c.get("Descripcion", ""), D(c.get("Cantidad")), subtotal, iva))
+    msg = ""
+    if missing_ref_obs:
+        msg = "XML procesado, pero REF.PAGO y OBS no vienen dentro del XML CFDI; por eso # DE UNIDAD y fecha servicio quedan vacios. Esos datos aparecen en el PDF/representacion impresa."
+    return rows, msg
+
+
+def parse_sat_generico(idx: CfdiIndex) -> Tuple[List[Dict[str, object]], str]:
+    h = common_header(idx)
+    rows = []
+    for c in get_concepts(idx):
+        descripcion = c.get("Descripcion", "")
+        subtotal = get_base_from_concept(idx, c)
+        iva = get_iva_from_concept(idx, c)
+        cantidad = D(c.get("Cantidad"))
+        cantidad_out = int(cantidad) if cantidad == cantidad.to_integral() else float(cantidad)
+        rows.append(make_row(h["empresa"], h["folio"] or h["serie_folio"], h["uuid"], h["fecha"], "",
+                             unit_from_description_after_colon(descripcion), descripcion, cantidad_out, subtotal, iva))
+    return rows, ""
+
+
+def parse_xml_bytes(file_name: str, xml_bytes: bytes, rapido: bool = True) -> Tuple[List[Dict[str, object]], Dict[str, object]]:
+    """``rapido=False`` fuerza la ruta ElementTree (para comparar contra lxml)."""
+    debug = {"archivo": file_name, "formato": "", "filas": 0, "estatus": "OK", "mensaje": ""}
+    if not xml_bytes or len(xml_bytes.strip()) == 0:
+        debug.update({"formato": "NO LEIDO", "estatus": "ERROR", "mensaje": "Archivo XML vacio (0 bytes)."})
+        return [], debug
+
+    idx = indice_lxml(xml_bytes) if rapido else None
+    if idx is None:
+        try:
+            root = ET.fromstring(xml_bytes)
+        except ET.ParseError as e:
+            debug.update({"formato": "NO LEIDO", "estatus": "ERROR", "mensaje": f"XML mal formado: {e}"})
+            return [], debug
+        idx = CfdiIndex(root)
+
+    formato = detect_format(idx)
+    debug["formato"] = formato
+    try:
+        if formato == "K9":
+            rows, msg = parse_k9(idx)
+        elif formato == "ROYAN":
+            rows, msg = parse_royan(idx)
+        elif formato == "WASH N CROSS":
+            rows, msg = parse_wash(idx)
+        elif formato == SAT_GENERICO:
+            rows, msg = parse_sat_generico(idx)
+        else:
+            rows, msg = [], "No se detecto como CFDI valido."
+            debug["estatus"] = "ERROR"
+        debug["filas"] = len(rows)
+        debug["mensaje"] = msg
+        if msg and debug["estatus"] == "OK":
+            debug["estatus"] = "OK CON AVISO"
+        return rows, debug
+    except Exception as e:
+        debug.update({"estatus": "ERROR", "mensaje": str(e)})
+        return [], debug
+
+
+def dataframe_to_excel_bytes(df: pd.DataFrame) -> bytes:
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False, sheet_name="Consolidado")
+        ws = writer.book["Consolidado"]
+        for col in ws.columns:
+            max_len = max(len(str(cell.value or "")) for cell in col)
+            ws.column_dimensions[col[0].column_letter].width = min(max_len + 2, 60)
+    return output.getvalue()
+
+
+# =====================================================
+# --- ARCHIVOS (.xml / .zip / .tar.gz) ---
+# =====================================================
+
+EXT_TAR = (".tar.gz", ".tgz", ".tar")
+
+
+def _es_xml(nombre: str) -> bool:
+    base = nombre.rsplit("/", 1)[-1]
+    return nombre.lower().endswith(".xml") and not nombre.startswith("__MACOSX/") and not base.startswith("._")
+
+
+def documentos_de(nombre: str, contenido: bytes) -> Iterator[Tuple[str, bytes]]:
+    """
+    ``(nombre, bytes)`` de cada XML: el archivo mismo, o los ``.xml`` dentro
+    de un .zip / .tar.gz leídos en memoria uno por uno (``zip/miembro.xml``);
+    un ``.xml.gz`` se descomprime.
+    """
+    bajo = nombre.lower()
+    if bajo.endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _es_xml(info.filename):
+                    yield f"{nombre}/{info.filename}", zf.read(info)
+    elif bajo.endswith(EXT_TAR):
+        with tarfile.open(fileobj=io.BytesIO(contenido), mode="r:*") as tf:
+            for info in tf:
+                if info.isfile() and _es_xml(info.name):
+                    yield f"{nombre}/{info.name}", tf.extractfile(info).read()
+    elif bajo.endswith(".gz"):  # un solo XML comprimido (.xml.gz)
+        yield nombre[:-3], gzip.decompress(contenido)
+    else:
+        yield nombre, contenido
+
+
+def contar_documentos(nombre: str, contenido: bytes) -> int:
+    """Cuántos XML trae el archivo (solo el índice del .zip / los encabezados del tar)."""
+    bajo = nombre.lower()
+    if bajo.endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+            return sum(1 for i in zf.infolist() if not i.is_dir() and _es_xml(i.filename))
+    if bajo.endswith(EXT_TAR):
+        with tarfile.open(fileobj=io.BytesIO(contenido), mode="r:*") as tf:
+            return sum(1 for i in tf if i.isfile() and _es_xml(i.name))
+    return 1
+
+
+# =====================================================
+# --- PROCESAMIENTO EN LOTES ---
+# =====================================================
+
+# XML por tarea (máximo): amortiza el envío entre procesos
+TAM_LOTE = 200
+# A partir de cuántos XML conviene pagar el arranque de procesos
+MIN_DOCS_PARALELO = 100
+
+Resultado = Tuple[int, List[Dict[str, object]], Dict[str, object]]
+
+
+def _parse_lote(lote: List[Tuple[int, str, bytes]]) -> List[Resultado]:
+    return [(i, *parse_xml_bytes(nombre, contenido)) for i, nombre, contenido in lote]
+
+
+def _lotes(documentos: Iterable[Tuple[str, bytes]], tam: int) -> Iterator[List[Tuple[int, str, bytes]]]:
+    lote = []
+    for i, (nombre, contenido) in enumerate(documentos):
+        lote.append((i, nombre, contenido))
+        if len(lote) == tam:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def procesar_documentos(
+    documentos: Iterable[Tuple[str, bytes]],
+    total: int = None,
+    max_workers: int = None,
+    tam_lote: int = TAM_LOTE,
+) -> Iterator[List[Resultado]]:
+    """
+    ``parse_xml_bytes`` sobre ``[(nombre, bytes), ...]`` en lotes de
+    ``tam_lote`` repartidos en procesos aparte. Produce cada lote conforme
+    termina como ``[(i, filas, debug), ...]`` (``i`` = posición del XML en
+    ``documentos``, para reordenar al final). Los XML se leen de
+    ``documentos`` solo conforme hay lugar en el pool.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    if total:
+        # lotes más chicos si no alcanzan para ~4 por worker
+        tam_lote = max(1, min(tam_lote, -(-total // (4 * workers))))
+    if workers < 2 or (total is not None and total < MIN_DOCS_PARALELO):
+        for lote in _lotes(documentos, tam_lote):
+            yield _parse_lote(lote)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pendientes = set()
+        for lote in _lotes(documentos, tam_lote):
+            pendientes.add(ex.submit(_parse_lote, lote))
+            # a lo más dos lotes por worker en vuelo
+            if len(pendientes) >= 2 * workers:
+                hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for fut in hechos:
+                    yield fut.result()
+        for fut in as_completed(pendientes):
+            yield fut.result()
@@ -0,0 +1,145 @@
+"""
+Prorrateo de un mes sin navegador.
+
+    python -m spgc.cli "PASO 1 MARZO.xlsx" --gts GTS.xlsx --catalogo catalogo.csv --salida salida/
+
+Escribe en ``--salida`` los mismos Excel que ofrece la página (resumen,
+prorrateo completo, generales/indirectos y tablitas de todas las sucursales)
+e imprime el tiempo de cada etapa.
+
+Si no se da ``--catalogo``, el catálogo se lee de Supabase con las variables
+de entorno SUPABASE_URL / SUPABASE_KEY; lo mismo para ``viajes_distribucion``
+cuando se da ``--fecha``.
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from spgc.normaliza import fecha_texto
+from spgc.pipeline import (
+    ErrorProrrateo,
+    armar_resultado,
+    calcular_porcentajes,
+    exportar_generales,
+    exportar_prorrateo,
+    exportar_resumen,
+    generales_indirectos,
+    generar_resumen,
+    leer_gts,
+    leer_paso1,
+    prorratear,
+    tablitas_mes,
+)
+from spgc.reglas import cargar_reglas
+from spgc.tablitas import exportar_tablitas_excel
+
+RENOMBRE_CATALOGO = {"area_cuenta": "AREA/CUENTA", "tipo_distribucion": "TIPO DISTRIBUCIÓN"}
+
+
+@contextmanager
+def _etapa(nombre: str, tiempos: dict):
+    t0 = time.perf_counter()
+    yield
+    tiempos[nombre] = time.perf_counter() - t0
+    print(f"  {nombre:<22} {tiempos[nombre]:8.3f} s")
+
+
+def _supabase():
+    from supabase import create_client
+
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        raise ErrorProrrateo("Faltan SUPABASE_URL o SUPABASE_KEY en variables de entorno.")
+    return create_client(url, key)
+
+
+def _leer_catalogo(ruta: str = None) -> pd.DataFrame:
+    if ruta:
+        cat = pd.read_csv(ruta) if ruta.lower().endswith(".csv") else pd.read_excel(ruta)
+    else:
+        cat = pd.DataFrame(_supabase().table("catalogo_distribucion").select("*").execute().data)
+    if cat.empty:
+        raise ErrorProrrateo("No hay datos en 'catalogo_distribucion'.")
+    return cat.rename(columns=RENOMBRE_CATALOGO)
+
+
+def _leer_viajes(fecha: str = None) -> pd.DataFrame:
+    if not fecha:
+        return None
+    dia = pd.Timestamp(fecha)
+    data = (
+        _supabase().table("viajes_distribucion")
+        .select("Sucursal,Trafico,Fecha")
+        .gte("Fecha", dia.strftime("%Y-%m-%d"))
+        .lt("Fecha", (dia + pd.Timedelta(days=1)).strftime("%Y-%m-%d"))
+        .execute().data
+    )
+    viajes = pd.DataFrame(data, columns=["Sucursal", "Trafico", "Fecha"])
+    viajes = viajes.rename(columns={"Sucursal": "SUCURSAL", "Trafico": "TRAFICO", "Fecha": "FECHA"})
+    viajes["SUCURSAL"] = viajes["SUCURSAL"].astype(str).str.upper().str.strip()
+    viajes["FECHA"] = fecha_texto(viajes["FECHA"], "%Y-%m-%d", dayfirst=False)
+    return viajes.drop_duplicates(subset=["SUCURSAL"], keep="last")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m spgc.cli", description="Prorrateo de Gastos Generales (un mes).")
+    ap.add_argument("paso1", help="Excel con la hoja 'PASO 1'")
+    ap.add_argument("--gts", help="Excel con la hoja 'GTS' (default: el mismo archivo de PASO 1)")
+    ap.add_argument("--catalogo", help="CSV/XLSX con area_cuenta,tipo_distribucion (default: Supabase)")
+    ap.add_argument("--reglas", help="CSV de reglas de TIPO COSTO (default: spgc/reglas_tipo_costo.csv)")
+    ap.add_argument("--fecha", help="Fecha de viajes_distribucion (YYYY-MM-DD) para Tráfico/Fecha")
+    ap.add_argument("--salida", default=".", help="Carpeta de salida")
+    args = ap.parse_args(argv)
+
+    salida = Path(args.salida)
+    salida.mkdir(parents=True, exist_ok=True)
+    tiempos = {}
+
+    try:
+        with _etapa("catálogo / viajes", tiempos):
+            catalogo = _leer_catalogo(args.catalogo)
+            reglas = cargar_reglas(args.reglas) if args.reglas else cargar_reglas()
+            viajes_sel = _leer_viajes(args.fecha)
+
+        with _etapa("leer PASO 1", tiempos):
+            df_original = leer_paso1(args.paso1)
+        with _etapa("resumen", tiempos):
+            resumen = generar_resumen(df_original)
+        with _etapa("leer GTS", tiempos):
+            df_gts = leer_gts(args.gts or args.paso1)
+        with _etapa("porcentajes", tiempos):
+            porcentajes = calcular_porcentajes(df_gts)
+        with _etapa("prorrateo", tiempos):
+            prorrateo = prorratear(df_original, porcentajes, catalogo, reglas)
+            avisos = prorrateo[2]
+            resultado = armar_resultado(prorrateo, viajes_sel)
+        with _etapa("generales/indirectos", tiempos):
+            generales, indirectos, final = generales_indirectos(resultado)
+        with _etapa("tablitas", tiempos):
+            tablitas = tablitas_mes(resultado, df_gts, catalogo)
+
+        with _etapa("exportar", tiempos):
+            (salida / "resumen_gastos_generales.xlsx").write_bytes(exportar_resumen(resumen))
+            (salida / "prorrateo_completo.xlsx").write_bytes(exportar_prorrateo(resultado))
+            (salida / "generales_indirectos_consolidado.xlsx").write_bytes(
+                exportar_generales(generales, indirectos, final)
+            )
+            (salida / "costo_por_sucursal_todas.xlsx").write_bytes(exportar_tablitas_excel(tablitas))
+    except ErrorProrrateo as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    for aviso in avisos:
+        print(f"AVISO: {aviso}", file=sys.stderr)
+    print(f"  {'total':<22} {sum(tiempos.values()):8.3f} s")
+    print(f"Listo: {len(resultado)} filas de prorrateo, {len(tablitas)} sucursales -> {salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
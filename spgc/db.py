@@ -0,0 +1,160 @@
+"""
+Acceso a Supabase compartido entre páginas.
+
+- Un solo cliente por proceso (``st.cache_resource``).
+- Lecturas con TTL (``st.cache_data``) llaveadas por tabla, columnas y filtros.
+- Cada escritura hecha por estas funciones sube la "versión" de la tabla, que
+  forma parte de la llave del cache: la siguiente lectura de esa tabla va a la
+  base aunque el TTL no haya vencido.
+"""
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import streamlit as st
+from supabase import Client, create_client
+
+TTL_LECTURA = 600  # segundos
+CHUNK_UPSERT = 500  # filas por request en upserts masivos
+
+# (operador, columna, valor) -> query.<operador>(columna, valor), p.ej. ("eq", "Fecha", "2025-01-31")
+Filtro = Tuple[str, str, Any]
+
+_versiones: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+@st.cache_resource
+def get_supabase() -> Client:
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
+
+
+def _version(tabla: str) -> int:
+    with _lock:
+        return _versiones.get(tabla, 0)
+
+
+def invalidar(tabla: str) -> None:
+    """Marca como obsoletas todas las lecturas cacheadas de ``tabla``."""
+    with _lock:
+        _versiones[tabla] = _versiones.get(tabla, 0) + 1
+
+
+@st.cache_data(ttl=TTL_LECTURA, show_spinner=False)
+def _fetch(
+    tabla: str,
+    columnas: str,
+    filtros: Tuple[Filtro, ...],
+    orden: Optional[Tuple[str, bool]],
+    limite: Optional[int],
+    version: int,
+) -> List[dict]:
+    # ``version`` solo participa en la llave del cache (sin "_" para que se hashee)
+    q = get_supabase().table(tabla).select(columnas)
+    for op, col, val in filtros:
+        q = getattr(q, op)(col, val)
+    if orden:
+        q = q.order(orden[0], desc=orden[1], nullsfirst=False)
+    if limite:
+        q = q.limit(limite)
+    return q.execute().data or []
+
+
+def fetch_tabla(
+    tabla: str,
+    columnas: str = "*",
+    filtros: Iterable[Filtro] = (),
+    orden: Optional[Tuple[str, bool]] = None,
+    limite: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    ``select(columnas)`` de ``tabla`` con filtros opcionales, cacheado.
+    ``orden`` es ``(columna, descendente)``; ``limite`` corta del lado del servidor.
+    """
+    filtros = tuple(tuple(f) for f in filtros)
+    return pd.DataFrame(_fetch(tabla, columnas, filtros, orden, limite, _version(tabla)))
+
+
+def fetch_extremos(tabla: str, columna: str) -> Tuple[Any, Any]:
+    """
+    ``(mínimo, máximo)`` de ``columna`` con dos consultas de una sola fila,
+    para que el costo no crezca con el histórico. ``(None, None)`` si no hay datos.
+    """
+    extremos = []
+    for desc in (False, True):
+        df = fetch_tabla(tabla, columnas=columna, orden=(columna, desc), limite=1)
+        extremos.append(df[columna].iloc[0] if not df.empty else None)
+    return tuple(extremos)
+
+
+def insert(tabla: str, payload: Union[dict, Sequence[dict]]):
+    res = get_supabase().table(tabla).insert(payload).execute()
+    invalidar(tabla)
+    return res
+
+
+def upsert(tabla: str, payload: Union[dict, Sequence[dict]], on_conflict: str = None):
+    kwargs = {"on_conflict": on_conflict} if on_conflict else {}
+    res = get_supabase().table(tabla).upsert(payload, **kwargs).execute()
+    invalidar(tabla)
+    return res
+
+
+def _como_texto(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    # comparación tolerante a tipos: None/NaN -> "", todo lo demás a str sin espacios
+    out = pd.DataFrame(index=df.index)
+    for c in cols:
+        col = df[c] if c in df.columns else pd.Series(None, index=df.index, dtype=object)
+        out[c] = col.astype(object).where(col.notna(), "").astype(str).str.strip()
+    return out
+
+
+def upsert_diff(
+    tabla: str,
+    registros: pd.DataFrame,
+    existentes: pd.DataFrame,
+    llave: Sequence[str],
+    on_conflict: str = None,
+    chunk: int = CHUNK_UPSERT,
+) -> Dict[str, int]:
+    """
+    Compara ``registros`` (columnas con el nombre de la tabla) contra lo ya
+    cargado en ``existentes`` y manda solo las filas nuevas o modificadas, en
+    upserts masivos de ``chunk`` filas.
+
+    Regresa ``{"insertados": n, "actualizados": n, "sin_cambio": n}``.
+    """
+    llave = list(llave)
+    registros = registros.drop_duplicates(subset=llave, keep="last").reset_index(drop=True)
+    cols = list(registros.columns)
+    resto = [c for c in cols if c not in llave]
+
+    nuevo_txt = _como_texto(registros, cols)
+    if existentes is None or existentes.empty or not set(llave) <= set(existentes.columns):
+        es_nuevo = pd.Series(True, index=registros.index)
+        cambio = pd.Series(False, index=registros.index)
+    else:
+        previo_txt = _como_texto(existentes, cols).drop_duplicates(subset=llave, keep="last")
+        cruce = nuevo_txt.merge(previo_txt, on=llave, how="left", suffixes=("", "__prev"), indicator=True)
+        es_nuevo = cruce["_merge"].eq("left_only")
+        cambio = pd.Series(False, index=cruce.index)
+        for c in resto:
+            cambio |= cruce[c].ne(cruce[f"{c}__prev"])
+        cambio &= ~es_nuevo
+
+    por_enviar = registros[(es_nuevo | cambio).to_numpy()]
+    if not por_enviar.empty:
+        payload = por_enviar.astype(object).where(por_enviar.notna(), None).to_dict(orient="records")
+        kwargs = {"on_conflict": on_conflict} if on_conflict else {}
+        cliente = get_supabase()
+        try:
+            for i in range(0, len(payload), chunk):
+                cliente.table(tabla).upsert(payload[i:i + chunk], **kwargs).execute()
+        finally:
+            invalidar(tabla)
+
+    return {
+        "insertados": int(es_nuevo.sum()),
+        "actualizados": int(cambio.sum()),
+        "sin_cambio": int(len(registros) - es_nuevo.sum() - cambio.sum()),
+    }
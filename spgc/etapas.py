@@ -0,0 +1,77 @@
+"""
+Grafo mínimo de etapas memoizadas por hash de contenido.
+
+Cada resultado es un ``Nodo(llave, valor)``. La llave de una etapa se arma con
+su nombre, las llaves de sus entradas y sus parámetros, así que en un rerun de
+Streamlit solo se recalculan las etapas que quedan río abajo de lo que
+realmente cambió (archivo subido, catálogo, fecha elegida...).
+
+Se guarda el último resultado de cada etapa en ``memoria`` (normalmente un
+dict dentro de ``st.session_state``). Los valores guardados se comparten entre
+reruns: quien los use no debe modificarlos en sitio.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Callable, List, MutableMapping, Optional
+
+import pandas as pd
+
+
+def _sha(*partes) -> str:
+    h = hashlib.sha256()
+    for p in partes:
+        h.update(p if isinstance(p, bytes) else str(p).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def llave_de(valor) -> str:
+    """Hash de contenido: bytes tal cual, DataFrames por fila (vectorizado), lo demás por repr."""
+    if valor is None:
+        return _sha("None")
+    if isinstance(valor, (bytes, bytearray, memoryview)):
+        return _sha(bytes(valor))
+    if isinstance(valor, pd.DataFrame):
+        filas = pd.util.hash_pandas_object(valor, index=True).to_numpy()
+        return _sha("df", list(valor.columns), filas.tobytes())
+    return _sha(type(valor).__name__, repr(valor))
+
+
+@dataclass(frozen=True)
+class Nodo:
+    llave: str
+    valor: Any
+
+    def parte(self, i: int) -> "Nodo":
+        """Nodo con el elemento ``i`` de un resultado tipo tupla."""
+        return Nodo(_sha(self.llave, i), self.valor[i])
+
+
+def entrada(valor, llave: str = None) -> Nodo:
+    """Nodo hoja (archivo subido, catálogo, fecha...)."""
+    return Nodo(llave or llave_de(valor), valor)
+
+
+class Grafo:
+    def __init__(self, memoria: MutableMapping):
+        self._memoria = memoria
+        self.recalculadas: List[str] = []
+
+    def etapa(self, nombre: str, fn: Callable, *entradas: Nodo, **params) -> Nodo:
+        """``fn(*valores de entradas, **params)``, solo si cambió alguna entrada."""
+        llave = _sha(nombre, *(e.llave for e in entradas), repr(sorted(params.items())))
+        previo = self._memoria.get(nombre)
+        if previo is not None and previo.llave == llave:
+            return previo
+
+        nodo = Nodo(llave, fn(*(e.valor for e in entradas), **params))
+        self._memoria[nombre] = nodo
+        self.recalculadas.append(nombre)
+        return nodo
+
+    def ultimo(self, nombre: str) -> Optional[Nodo]:
+        """Último resultado calculado de ``nombre`` (o None si nunca corrió)."""
+        return self._memoria.get(nombre)
+
+    def olvidar(self, nombre: str) -> None:
+        self._memoria.pop(nombre, None)
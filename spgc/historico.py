@@ -0,0 +1,169 @@
+"""
+Lectura del Excel histórico (una hoja por sucursal, con bloques mensuales tipo
+'ENERO 2025').
+
+Cada hoja se lee en modo ``read_only`` como un arreglo de valores
+(``iter_rows(values_only=True)``), los títulos de mes se detectan con un solo
+escaneo vectorizado y las hojas se procesan en paralelo en procesos aparte.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+MESES_ES = [
+    "ENERO","FEBRERO","MARZO","ABRIL","MAYO","JUNIO",
+    "JULIO","AGOSTO","SEPTIEMBRE","SETIEMBRE","OCTUBRE","NOVIEMBRE","DICIEMBRE"
+]
+
+# Encabezados esperados en la tablita superior
+HEADS = ["FACTURACIÓN","COSTOS DIRECTOS","UTILIDAD","% UT BRUTA","COSTOS INDIRECTOS","% CI",
+         "GASTOS GENERALES","% GN","UT/PER","%UT/PER"]
+
+COLS_CONSOLIDADO = ["Mes","Sucursal","Facturación","Costos Dire","Utilidad","% Ut Bruta",
+                    "Costos Indirectos","% CI","Gastos Generales","% GN","UT/PER","%UT/PER"]
+
+_RE_MES = "|".join(MESES_ES)
+_RE_ANIO = r"\b20\d{2}\b"
+
+# A partir de cuántas hojas conviene pagar el arranque de procesos
+MIN_HOJAS_PARALELO = 3
+
+
+def _extraer_mes(v) -> str:
+    # "ENERO 2025" -> "ENERO"
+    s = str(v).strip().upper()
+    for m in MESES_ES:
+        if m in s:
+            return m
+    return s
+
+
+def orden_mes(m):
+    d = {m:i+1 for i,m in enumerate(["ENERO","FEBRERO","MARZO","ABRIL","MAYO","JUNIO","JULIO","AGOSTO","SEPTIEMBRE","OCTUBRE","NOVIEMBRE","DICIEMBRE"])}
+    return d.get(str(m).strip().upper(), 999)
+
+
+def _normaliza_header(h):
+    s = str(h).strip().upper()
+    s = s.replace("FACTURACION","FACTURACIÓN")  # por si viene sin acento
+    return s
+
+
+def valores_hoja(ws) -> np.ndarray:
+    """Arreglo 2D (object) con los valores de la hoja, filas rellenadas con None."""
+    filas = [tuple(f) for f in ws.iter_rows(values_only=True)]
+    if not filas:
+        return np.empty((0, 0), dtype=object)
+    ancho = max(len(f) for f in filas)
+    grid = np.full((len(filas), ancho), None, dtype=object)
+    for i, f in enumerate(filas):
+        grid[i, :len(f)] = f
+    return grid
+
+
+def _posiciones_titulo(grid: np.ndarray) -> List[Tuple[int, int]]:
+    """(fila, col) 0-based de todas las celdas tipo 'ENERO 2025', en orden fila-columna."""
+    if grid.size == 0:
+        return []
+    plano = pd.Series(grid.ravel())
+    es_txt = plano.map(lambda v: isinstance(v, str)).astype(bool)
+    txt = plano[es_txt].str.strip().str.upper()
+    ok = txt.str.contains(_RE_MES, regex=True) & txt.str.contains(_RE_ANIO, regex=True)
+    pos = txt.index[ok.to_numpy()].to_numpy()
+    return list(zip(*np.divmod(pos, grid.shape[1])))
+
+
+def parse_sheet(grid: np.ndarray, sheet_name: str) -> pd.DataFrame:
+    """
+    Busca todos los títulos tipo 'ENERO 2025' en la hoja (arreglo de valores).
+    Para cada título encontrado:
+      - fila+1: headers
+      - fila+2: valores
+    Construye dataframe consolidado.
+    """
+    rows = []
+    max_r, max_c = grid.shape
+
+    def _fila(r, c):
+        # 10 columnas desde c (como en el layout); fuera de la hoja = None
+        vals = list(grid[r, c:c + 10])
+        return vals + [None] * (10 - len(vals))
+
+    for r, c in _posiciones_titulo(grid):
+        # headers en r+1, valores en r+2
+        if r + 2 >= max_r:
+            continue
+
+        headers = [_normaliza_header(h) for h in _fila(r + 1, c)]
+        values = _fila(r + 2, c)
+
+        # Validación mínima: que existan columnas clave
+        if "FACTURACIÓN" not in headers:
+            continue
+        if "UT/PER" not in headers:
+            continue
+
+        d = dict(zip(headers, values))
+        rows.append({
+            "Mes": _extraer_mes(grid[r, c]),
+            "Sucursal": str(sheet_name).strip().upper(),
+            "Facturación": float(d.get("FACTURACIÓN") or 0),
+            "Costos Dire": float(d.get("COSTOS DIRECTOS") or 0),
+            "Utilidad": float(d.get("UTILIDAD") or 0),
+            "% Ut Bruta": float(d.get("% UT BRUTA") or 0),
+            "Costos Indirectos": float(d.get("COSTOS INDIRECTOS") or 0),
+            "% CI": float(d.get("% CI") or 0),
+            "Gastos Generales": float(d.get("GASTOS GENERALES") or 0),
+            "% GN": float(d.get("% GN") or 0),
+            "UT/PER": float(d.get("UT/PER") or 0),
+            "%UT/PER": float(d.get("%UT/PER") or 0),
+        })
+
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows)
+
+    # quitar duplicados si existen
+    df = df.drop_duplicates(subset=["Mes","Sucursal"], keep="last")
+
+    # ordenar por mes
+    df["__m"] = df["Mes"].apply(orden_mes)
+    df = df.sort_values(["Sucursal","__m"]).drop(columns="__m").reset_index(drop=True)
+
+    return df[COLS_CONSOLIDADO]
+
+
+def _parse_hoja(args) -> pd.DataFrame:
+    # Se ejecuta en un proceso aparte: cada worker abre su propia copia read_only
+    contenido, sheet_name = args
+    wb = openpyxl.load_workbook(BytesIO(contenido), read_only=True, data_only=True)
+    try:
+        return parse_sheet(valores_hoja(wb[sheet_name]), sheet_name)
+    finally:
+        wb.close()
+
+
+def leer_historico(contenido: bytes, max_workers: int = None) -> Dict[str, pd.DataFrame]:
+    """
+    Regresa ``{hoja: DataFrame}`` (mismo orden de hojas que el libro) solo con
+    las hojas donde se encontraron bloques mensuales.
+    """
+    wb = openpyxl.load_workbook(BytesIO(contenido), read_only=True, data_only=True)
+    hojas = list(wb.sheetnames)
+    wb.close()
+
+    tareas = [(contenido, sh) for sh in hojas]
+    workers = min(len(hojas), max_workers or os.cpu_count() or 1)
+    if len(hojas) < MIN_HOJAS_PARALELO or workers < 2:
+        resultados = [_parse_hoja(t) for t in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            resultados = list(ex.map(_parse_hoja, tareas))
+
+    return {sh: df for sh, df in zip(hojas, resultados) if not df.empty}
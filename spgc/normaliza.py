@@ -0,0 +1,231 @@
+"""
+Normalización por columna (texto, llaves, importes, viajes, conceptos y
+fechas) compartida por el Comparador STAR vs SAC, las páginas de Saldos
+Owner, el cross-match de pólizas, Reporte Auxiliares, Rutas Frecuentes y los
+viajes del Prorrateador.
+
+Todas las funciones reciben y regresan una ``Series`` con el mismo índice.
+Las columnas de estos reportes repiten mucho (conceptos, pólizas, importes),
+así que cada operación se hace una sola vez por valor distinto
+(``por_valor``: factorize y luego repartir) con operaciones ``.str``
+vectorizadas sobre esos valores.
+
+``norm_text`` / ``norm_for_key`` quedan como versiones escalares para nombres
+de columnas y valores sueltos.
+"""
+import re
+import unicodedata
+import warnings
+from collections import Counter
+from datetime import date
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Número "limpio" que float() acepta; el resto queda como NaN
+_RE_NUMERO = r"^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$"
+
+REGLAS_CONCEPTO = [
+    (r"\bPERSONAL LOAN\b|\bLOAN\b|\bPRESTAMO\b", "LOAN/PERSONAL LOAN"),
+    (r"\bDIESEL\b|\bCONSUMIBLES\b", "CXP DIESEL/CONSUMIBLES"),
+    (r"\bANTICIPO\b|\bADVANCE\b", "CXP ANTICIPO"),
+]
+
+# Fechas: día 0 de los seriales de Excel y cuántos valores distintos se
+# revisan para adivinar el formato dominante de una columna
+ORIGEN_EXCEL = "1899-12-30"
+MUESTRA_FECHAS = 200
+RONDAS_FORMATO = 3
+
+
+def por_valor(s: pd.Series, fn: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """
+    Aplica ``fn`` (Series -> Series) solo a los valores distintos de ``s`` y
+    reparte el resultado. Los faltantes (None/NaN) llegan a ``fn`` como un
+    solo valor NaN.
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    res = fn(pd.Series(uniques, dtype=object)).to_numpy()
+    return pd.Series(res[codes], index=s.index, name=s.name)
+
+
+def _sin_marcas(t: str) -> str:
+    # NFKD y fuera las marcas diacríticas (unicodedata.combining)
+    return "".join(c for c in unicodedata.normalize("NFKD", t) if not unicodedata.combining(c))
+
+
+def _texto_unicos(u: pd.Series, sin_acentos: bool) -> pd.Series:
+    s = u.where(u.notna(), "").astype(str).str.strip().str.upper()
+    if sin_acentos:
+        # solo los valores no-ASCII pueden traer acentos
+        acentos = ~s.map(str.isascii).astype(bool)
+        if acentos.any():
+            s[acentos] = s[acentos].map(_sin_marcas)
+    return s.str.replace(r"\s+", " ", regex=True)
+
+
+def _llave_de_texto(t: pd.Series) -> pd.Series:
+    # ``t`` ya viene de _texto_unicos(sin_acentos=True)
+    return t.str.replace(r"[^A-Z0-9]+", " ", regex=True).str.strip()
+
+
+def _llave_unicos(u: pd.Series) -> pd.Series:
+    return _llave_de_texto(_texto_unicos(u, sin_acentos=True))
+
+
+def texto(s: pd.Series, sin_acentos: bool = False) -> pd.Series:
+    """Mayúsculas, sin espacios en los extremos ni repetidos; faltantes -> ''."""
+    return por_valor(s, lambda u: _texto_unicos(u, sin_acentos))
+
+
+def llave(s: pd.Series) -> pd.Series:
+    """Texto sin acentos y solo A-Z/0-9 separados por un espacio (para cruces)."""
+    return por_valor(s, _llave_unicos)
+
+
+def importe(s: pd.Series, ndigits: Optional[int] = 2, relleno: float = np.nan) -> pd.Series:
+    """
+    Importe como float redondeado a ``ndigits`` (``None`` = sin redondeo).
+    Acepta '$', comas, espacios y negativos entre paréntesis '(1,234.50)'.
+    Faltantes y textos que no son número -> ``relleno``.
+    """
+    def _unicos(u: pd.Series) -> pd.Series:
+        limpio = u.astype(str).str.replace(r"[$,\s]", "", regex=True)
+        parentesis = limpio.str.match(r"^\(.*\)$")
+        limpio = limpio.where(~parentesis, "-" + limpio.str[1:-1])
+        valido = u.notna() & limpio.str.match(_RE_NUMERO)
+
+        # astype(float) convierte igual que float(); to_numeric puede variar en el último dígito
+        num = pd.Series(relleno, index=u.index, dtype=float)
+        num[valido] = limpio[valido].astype(float)
+        if ndigits is not None:
+            num = pd.Series([round(v, ndigits) for v in num.tolist()], index=u.index, dtype=float)
+        return num
+
+    return por_valor(s, _unicos).astype(float)
+
+
+def viaje(s: pd.Series) -> pd.Series:
+    """Número de viaje sin '/' ni '-', en mayúsculas; faltantes -> ''."""
+    def _unicos(u: pd.Series) -> pd.Series:
+        return (
+            u.where(u.notna(), "").astype(str)
+             .str.replace("/", "", regex=False).str.replace("-", "", regex=False)
+             .str.strip().str.upper()
+        )
+    return por_valor(s, _unicos)
+
+
+def concepto(s: pd.Series, concept_map: Optional[Dict[str, str]] = None) -> pd.Series:
+    """
+    Concepto canónico: sin sufijos tipo ' - 20170908', como llave, luego
+    ``concept_map`` (llave -> canónico) y al final ``REGLAS_CONCEPTO``.
+    """
+    def _unicos(u: pd.Series) -> pd.Series:
+        base = _texto_unicos(u, sin_acentos=True)
+        base = base.str.replace(r"\s+-\s+\d+.*$", "", regex=True)
+        base = base.str.replace(r"\s+-\s+[A-Z0-9]+.*$", "", regex=True).str.strip()
+        k = _llave_de_texto(base)
+
+        condiciones = [k.str.contains(patron, regex=True) for patron, _ in REGLAS_CONCEPTO]
+        out = pd.Series(np.select(condiciones, [v for _, v in REGLAS_CONCEPTO], default=k), index=k.index)
+        if concept_map:
+            mapeado = k.map(concept_map)
+            out = mapeado.where(mapeado.notna(), out)
+        return out
+
+    return por_valor(s, _unicos)
+
+
+# =====================================================
+# --- Fechas ---
+# =====================================================
+
+def _formato_fecha(v: str, dayfirst: bool) -> Optional[str]:
+    fmt = guess_datetime_format(v, dayfirst=dayfirst)
+    # con dayfirst, '2025-03-04' se adivina como año-día-mes; ISO siempre es año-mes-día
+    if fmt and fmt.startswith("%Y-%d-%m"):
+        fmt = "%Y-%m-%d" + fmt[len("%Y-%d-%m"):]
+    return fmt
+
+
+def _formato_dominante(t: pd.Series, dayfirst: bool) -> Optional[str]:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        formatos = Counter(_formato_fecha(v, dayfirst) for v in t.iloc[:MUESTRA_FECHAS])
+    formatos.pop(None, None)
+    return formatos.most_common(1)[0][0] if formatos else None
+
+
+def _sin_zona(p: pd.Series) -> pd.Series:
+    if p.dtype == object:  # offsets mezclados
+        p = pd.to_datetime(p, utc=True, errors="coerce")
+    if isinstance(p.dtype, pd.DatetimeTZDtype):
+        p = p.dt.tz_localize(None)
+    return p
+
+
+def _fechas_unicos(u: pd.Series, dayfirst: bool) -> pd.Series:
+    out = pd.Series(pd.NaT, index=u.index, dtype="datetime64[ns]")
+
+    es_fecha = u.map(lambda v: isinstance(v, (date, np.datetime64))).astype(bool)
+    if es_fecha.any():
+        out[es_fecha] = _sin_zona(pd.to_datetime(u[es_fecha], errors="coerce"))
+
+    # Seriales de Excel (número o texto numérico)
+    resto = u[~es_fecha & u.notna()]
+    num = pd.to_numeric(resto, errors="coerce")
+    es_num = num.notna()
+    if es_num.any():
+        out[num.index[es_num]] = pd.to_datetime(num[es_num], unit="D", origin=ORIGEN_EXCEL, errors="coerce")
+
+    t = resto[~es_num].astype(str).str.strip()
+    t = t[t != ""]
+
+    # Ruta rápida: formato dominante explícito; lo que no entra se reintenta
+    # con el formato dominante de lo que sobra
+    for _ in range(RONDAS_FORMATO):
+        fmt = _formato_dominante(t, dayfirst) if len(t) else None
+        if fmt is None:
+            break
+        p = pd.to_datetime(t, format=fmt, errors="coerce")
+        ok = p.notna()
+        if not ok.any():
+            break
+        out[t.index[ok]] = _sin_zona(p[ok])
+        t = t[~ok]
+
+    # Sin formato reconocible: uno por uno (dateutil), como hace to_datetime
+    if len(t):
+        p = pd.to_datetime(t, format="mixed", dayfirst=dayfirst, errors="coerce")
+        out[t.index] = _sin_zona(p)
+    return out
+
+
+def fecha(s: pd.Series, dayfirst: bool = True) -> pd.Series:
+    """
+    Fecha (datetime64) desde texto con formato dominante de la columna,
+    seriales de Excel o fechas ya leídas; lo que no se reconoce -> NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    return por_valor(s, lambda u: _fechas_unicos(u, dayfirst))
+
+
+def fecha_texto(s: pd.Series, formato: str = "%d/%m/%Y", dayfirst: bool = True) -> pd.Series:
+    """Como ``fecha`` pero ya como texto en ``formato``; lo que no se reconoce -> NaN."""
+    return por_valor(s, lambda u: _fechas_unicos(u, dayfirst).dt.strftime(formato))
+
+
+# =====================================================
+# --- Escalares (nombres de columnas, valores sueltos) ---
+# =====================================================
+
+def norm_text(x: object, sin_acentos: bool = False) -> str:
+    return texto(pd.Series([x], dtype=object), sin_acentos).iat[0]
+
+
+def norm_for_key(x: object) -> str:
+    return llave(pd.Series([x], dtype=object)).iat[0]
@@ -0,0 +1,390 @@
+"""
+Pipeline de prorrateo (Módulos 1–5 del Prorrateador) como funciones puras,
+sin Streamlit, para poder correrlo por lotes (varios meses en paralelo).
+
+Los errores que en la página detienen el flujo se levantan como
+``ErrorProrrateo`` con el mismo mensaje; los avisos se regresan como lista de
+textos.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from spgc.historico import COLS_CONSOLIDADO, MESES_ES, orden_mes
+from spgc.prorrateo import prorratear_gasto_general
+from spgc.reglas import clasificar_tipo_costo
+from spgc.tablitas import generar_tablitas
+
+COMUNES = ["GASTO GENERAL", "INTERNO", "EXTERNO"]
+
+
+class ErrorProrrateo(ValueError):
+    """Insumos incompletos o inconsistentes: el flujo no puede continuar."""
+
+
+COLS_FACT = ["FACTURACION DLLS", "FACTURACIÓN DLLS", "FACTURACION", "FACTURACIÓN"]
+COLS_MC = ["MC", "M.C.", "MARGEN", "MARGEN CONTRIBUCION", "MARGEN DE CONTRIBUCION"]
+
+
+# =========================
+# Módulo 1: PASO 1 + resumen de comunes
+# =========================
+def leer_paso1(archivo) -> pd.DataFrame:
+    df = pd.read_excel(archivo, sheet_name="PASO 1")
+    df.columns = df.columns.str.strip().str.upper()
+
+    required = {"SUCURSAL", "AREA/CUENTA", "CARGOS"}
+    missing = required - set(df.columns)
+    if missing:
+        raise ErrorProrrateo(f"❌ Faltan columnas requeridas en PASO 1: {sorted(missing)}")
+
+    df["SUCURSAL"] = df["SUCURSAL"].astype(str).str.strip().str.upper()
+    return df
+
+
+def generar_resumen(df: pd.DataFrame) -> pd.DataFrame:
+    """COMUNES (GASTO GENERAL / INTERNO / EXTERNO) agrupados por AREA/CUENTA."""
+    comunes_base = df[df["SUCURSAL"].isin(COMUNES)]
+    if comunes_base.empty:
+        raise ErrorProrrateo("❌ No hay filas con SUCURSAL = GASTO GENERAL / INTERNO / EXTERNO. No hay comunes para resumir.")
+
+    return (
+        comunes_base
+        .groupby("AREA/CUENTA", as_index=False)["CARGOS"]
+        .sum()
+        .sort_values(by="CARGOS", ascending=False)
+    )
+
+
+# =========================
+# Módulo 3: GTS + porcentajes
+# =========================
+def leer_gts(archivo) -> pd.DataFrame:
+    df_gts = pd.read_excel(archivo, sheet_name="GTS")
+    df_gts.columns = df_gts.columns.str.strip().str.upper()
+    return df_gts
+
+
+def calcular_porcentajes(df_gts: pd.DataFrame) -> pd.DataFrame:
+    """Participación de cada sucursal por tipo de distribución, indexado por SUCURSAL."""
+    tipo_distrib_cols = df_gts.columns.drop("SUCURSAL")
+
+    porcentajes = df_gts.copy()
+    for col in tipo_distrib_cols:
+        total = df_gts[col].sum()
+        if total != 0:
+            porcentajes[col] = df_gts[col] / total
+        else:
+            porcentajes[col] = 0
+
+    return porcentajes.assign(
+        SUCURSAL=lambda d: d["SUCURSAL"].astype(str).str.strip().str.upper()
+    ).set_index("SUCURSAL")
+
+
+# =========================
+# Módulo 4: prorrateo
+# =========================
+def _suc_key(x: str) -> str:
+    # Convierte "CAR GAR", "CAR-GAR", "CAR/GAR" -> "CARGAR"
+    return re.sub(r"[^A-Z0-9]", "", str(x).strip().upper())
+
+
+def prorratear(
+    df_original: pd.DataFrame,
+    porcentajes: pd.DataFrame,
+    catalogo: pd.DataFrame,
+    reglas: pd.DataFrame = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """
+    Costos con sucursal asignada (Bloque A) + comunes prorrateados (Bloque B).
+
+    ``catalogo`` ya renombrado a AREA/CUENTA / TIPO DISTRIBUCIÓN; ``reglas`` de
+    TIPO COSTO (ver ``spgc.reglas``), por default las del archivo local.
+    Regresa ``(directos_agr, prorr_gg, avisos)``; Tráfico/Fecha se anexan aparte.
+    """
+    avisos = []
+    df_original = df_original.copy()
+    porcentajes = porcentajes.copy()
+
+    df_original.columns = df_original.columns.str.strip().str.upper()
+    porcentajes.columns = [str(c).upper() for c in porcentajes.columns]
+    if "CONCEPTO" not in df_original.columns:
+        df_original["CONCEPTO"] = ""
+
+    # ============ BLOQUE A: COSTOS CON SUCURSAL ASIGNADA ============
+    df_original["SUCURSAL"] = df_original["SUCURSAL"].astype(str).str.strip().str.upper()
+
+    # Homologar sucursal usando GTS como verdad (ej: "CARGAR" -> "CAR-GAR")
+    suc_validas = porcentajes.index.tolist()
+    map_suc = {_suc_key(s): s for s in suc_validas}
+    df_original["SUCURSAL_ORIG"] = df_original["SUCURSAL"]
+    df_original["SUCURSAL"] = df_original["SUCURSAL"].apply(lambda s: map_suc.get(_suc_key(s), s))
+
+    no_recon = df_original[
+        (~df_original["SUCURSAL"].isin(COMUNES)) &
+        (~df_original["SUCURSAL"].isin(suc_validas))
+    ]["SUCURSAL_ORIG"].dropna().astype(str).unique().tolist()
+    if no_recon:
+        avisos.append(f"Sucursales NO reconocidas (revisa ortografía): {no_recon[:15]}{'...' if len(no_recon)>15 else ''}")
+
+    # COSTO INDIRECTO = todo lo que NO sea común
+    no_general = df_original[~df_original["SUCURSAL"].isin(COMUNES)].copy()
+    no_general["TIPO COSTO"] = "COSTO INDIRECTO"
+    no_general["TIPO DISTRIBUCIÓN"] = "Costo fijo en sucursal"
+
+    directos_agr = (
+        no_general
+        .groupby(["AREA/CUENTA", "SUCURSAL", "TIPO DISTRIBUCIÓN", "TIPO COSTO"], as_index=False)["CARGOS"]
+        .sum()
+        .rename(columns={"CARGOS": "CARGO ASIGNADO"})
+    )
+
+    # ============ BLOQUE B: COMUNES (prorrateo) ============
+    comunes = df_original[df_original["SUCURSAL"].isin(COMUNES)].copy()
+    if comunes.empty:
+        raise ErrorProrrateo("❌ No hay filas con SUCURSAL = GASTO GENERAL / INTERNO / EXTERNO para prorratear.")
+
+    comunes["TIPO COSTO"] = clasificar_tipo_costo(comunes, reglas)
+
+    gg_agr = (
+        comunes
+        .groupby(["AREA/CUENTA", "TIPO COSTO"], as_index=False)["CARGOS"]
+        .sum()
+        .rename(columns={"CARGOS": "TOTAL_AREA"})
+    )
+
+    gg_agr = gg_agr.merge(catalogo, on="AREA/CUENTA", how="left")
+    if gg_agr["TIPO DISTRIBUCIÓN"].isna().any():
+        faltantes = gg_agr.loc[gg_agr["TIPO DISTRIBUCIÓN"].isna(), "AREA/CUENTA"].unique().tolist()
+        raise ErrorProrrateo(f"Faltan tipos de distribución en el catálogo para: {faltantes[:10]}{'...' if len(faltantes)>10 else ''}")
+
+    prorr_gg, omitidas = prorratear_gasto_general(gg_agr, porcentajes)
+    for tipo_dist, area in omitidas:
+        avisos.append(f"No hay porcentajes para el tipo '{tipo_dist}'. Se omite AREA/CUENTA: {area}")
+
+    return directos_agr, prorr_gg, avisos
+
+
+def anexar_trafico_fecha(df: pd.DataFrame, viajes_sel: pd.DataFrame = None) -> pd.DataFrame:
+    """Anexa TRAFICO / FECHA por SUCURSAL (``viajes_sel`` ya de una sola fecha)."""
+    if df.empty or viajes_sel is None:
+        return df.assign(TRAFICO=None, FECHA=None)
+    return df.merge(viajes_sel[["SUCURSAL", "TRAFICO", "FECHA"]], on="SUCURSAL", how="left")
+
+
+def armar_resultado(prorrateo: Tuple[pd.DataFrame, pd.DataFrame, List[str]], viajes_sel: pd.DataFrame = None) -> pd.DataFrame:
+    """Prorrateo completo (directos + comunes) con Tráfico/Fecha de la fecha elegida."""
+    directos_agr, prorr_gg, _ = prorrateo
+    return pd.concat(
+        [anexar_trafico_fecha(directos_agr, viajes_sel), anexar_trafico_fecha(prorr_gg, viajes_sel)],
+        ignore_index=True,
+    )
+
+
+# =========================
+# Módulo 5 / tablitas
+# =========================
+def generales_indirectos(prorr: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Módulo 5: ``(comunes por sucursal, indirectos por sucursal, consolidado)``
+    con las columnas que se muestran y exportan.
+    """
+    prorr = prorr.copy()
+    prorr.columns = prorr.columns.str.upper()
+
+    # 1) Comunes por sucursal (ya vienen con nombres finales)
+    comunes = prorr[prorr["TIPO COSTO"].isin(["COMUN INTERNO", "COMUN EXTERNO"])]
+    pivot_comunes = (
+        comunes.pivot_table(
+            index="SUCURSAL",
+            columns="TIPO COSTO",
+            values="CARGO ASIGNADO",
+            aggfunc="sum",
+            fill_value=0.0,
+        )
+        .reset_index()
+    )
+    for expected in ["COMUN INTERNO", "COMUN EXTERNO"]:
+        if expected not in pivot_comunes.columns:
+            pivot_comunes[expected] = 0.0
+
+    # 2) Indirectos: todo lo etiquetado como COSTO INDIRECTO
+    indirectos = (
+        prorr[prorr["TIPO COSTO"] == "COSTO INDIRECTO"]
+        .groupby("SUCURSAL", as_index=False)["CARGO ASIGNADO"]
+        .sum()
+        .rename(columns={"CARGO ASIGNADO": "INDIRECTO"})
+    )
+
+    # 3) Consolidado: comunes separados + indirecto + total
+    final = pivot_comunes.merge(indirectos, on="SUCURSAL", how="outer").fillna(0.0)
+    final["TOTAL"] = final["COMUN INTERNO"] + final["COMUN EXTERNO"] + final["INDIRECTO"]
+
+    return (
+        pivot_comunes[["SUCURSAL", "COMUN INTERNO", "COMUN EXTERNO"]],
+        indirectos,
+        final[["SUCURSAL", "COMUN INTERNO", "COMUN EXTERNO", "INDIRECTO", "TOTAL"]],
+    )
+
+
+def _find_col(df, candidates):
+    cols = list(df.columns)
+    for c in candidates:
+        if c in cols:
+            return c
+    # fallback: búsqueda parcial
+    for c in cols:
+        for cand in candidates:
+            if cand in c:
+                return c
+    return None
+
+
+def columnas_gts(df_gts: pd.DataFrame) -> Tuple[str, str]:
+    """(columna facturación, columna MC) del GTS."""
+    col_fact = _find_col(df_gts, COLS_FACT)
+    col_mc = _find_col(df_gts, COLS_MC)
+    if not col_fact or not col_mc:
+        raise ErrorProrrateo(
+            "No pude detectar columnas en GTS.\n"
+            f"Encontré: {list(df_gts.columns)}\n\n"
+            "Asegúrate de tener algo como 'FACTURACION DLLS' y 'MC'."
+        )
+    return col_fact, col_mc
+
+
+def tablitas_mes(resultado: pd.DataFrame, df_gts: pd.DataFrame, catalogo: pd.DataFrame):
+    """Tablitas de todas las sucursales a partir del prorrateo completo."""
+    df_gts = df_gts.copy()
+    df_gts.columns = df_gts.columns.astype(str).str.strip().str.upper()
+    df_gts["SUCURSAL"] = df_gts["SUCURSAL"].astype(str).str.strip().str.upper()
+
+    prorr = resultado.copy()
+    prorr.columns = prorr.columns.astype(str).str.strip().str.upper()
+    prorr["SUCURSAL"] = prorr["SUCURSAL"].astype(str).str.strip().str.upper()
+
+    catalogo = catalogo.copy()
+    catalogo["AREA/CUENTA"] = catalogo["AREA/CUENTA"].astype(str).str.strip().str.upper()
+
+    col_fact, col_mc = columnas_gts(df_gts)
+    return generar_tablitas(prorr, df_gts, catalogo, col_fact, col_mc)
+
+
+# =========================
+# Exportación
+# =========================
+def _excel(hojas: Dict[str, pd.DataFrame]) -> bytes:
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        for nombre, df in hojas.items():
+            df.to_excel(writer, sheet_name=nombre, index=False)
+    return buffer.getvalue()
+
+
+def exportar_resumen(resumen: pd.DataFrame) -> bytes:
+    return _excel({"Resumen Gastos": resumen})
+
+
+def exportar_prorrateo(resultado: pd.DataFrame) -> bytes:
+    return _excel({"Prorrateo": resultado})
+
+
+def exportar_generales(generales: pd.DataFrame, indirectos: pd.DataFrame, consolidado: pd.DataFrame) -> bytes:
+    return _excel({"Generales": generales, "Indirectos": indirectos, "Consolidado": consolidado})
+
+
+# =========================
+# Lote: varios meses
+# =========================
+def mes_de_nombre(nombre: str) -> Optional[str]:
+    """'PASO 1 MARZO 2025.xlsx' -> 'MARZO' (None si no trae mes)."""
+    s = str(nombre).upper()
+    for m in MESES_ES:
+        if m in s:
+            return "SEPTIEMBRE" if m == "SETIEMBRE" else m
+    return None
+
+
+def correr_mes(
+    mes: str,
+    paso1: bytes,
+    gts: bytes,
+    catalogo: pd.DataFrame,
+    reglas: pd.DataFrame = None,
+) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Módulos 1–5 para un mes. Regresa la tablita superior de cada sucursal con
+    las columnas del consolidado histórico (``COLS_CONSOLIDADO``) y los avisos.
+    """
+    df_original = leer_paso1(BytesIO(paso1))
+    generar_resumen(df_original)  # valida que haya comunes
+    df_gts = leer_gts(BytesIO(gts))
+    porcentajes = calcular_porcentajes(df_gts)
+
+    prorrateo = prorratear(df_original, porcentajes, catalogo, reglas)
+    avisos = prorrateo[2]
+    resultado = armar_resultado(prorrateo)
+
+    tablitas = tablitas_mes(resultado, df_gts, catalogo)
+    if not tablitas:
+        return pd.DataFrame(columns=COLS_CONSOLIDADO), avisos
+
+    top = pd.concat([t[0] for t in tablitas.values()], ignore_index=True)
+    top = top.rename(columns={"Costos Directos": "Costos Dire"})
+    top.insert(0, "Mes", mes)
+    return top[COLS_CONSOLIDADO], avisos
+
+
+def _correr_mes(args):
+    mes, paso1, gts, catalogo, reglas = args
+    try:
+        df, avisos = correr_mes(mes, paso1, gts, catalogo, reglas)
+        return mes, df, avisos, None
+    except Exception as e:
+        return mes, None, [], str(e)
+
+
+def correr_anio(
+    meses: Sequence[Tuple[str, bytes, bytes]],
+    catalogo: pd.DataFrame,
+    reglas: pd.DataFrame = None,
+    max_workers: int = None,
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, List[str]], Dict[str, str]]:
+    """
+    Corre hasta 12 meses ``(mes, bytes PASO 1, bytes GTS)`` en procesos aparte.
+
+    Regresa ``(por_sucursal, avisos, errores)``: ``por_sucursal`` es
+    ``{SUCURSAL: DataFrame}`` ordenado por mes, igual que ``leer_historico``,
+    para exportarlo con el mismo formato del consolidado histórico.
+    """
+    if len(meses) > 12:
+        raise ErrorProrrateo("Máximo 12 meses por corrida.")
+
+    tareas = [(mes, paso1, gts, catalogo, reglas) for mes, paso1, gts in meses]
+    workers = min(len(tareas), max_workers or os.cpu_count() or 1)
+    if workers < 2:
+        salidas = [_correr_mes(t) for t in tareas]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            salidas = list(ex.map(_correr_mes, tareas))
+
+    avisos = {mes: av for mes, _, av, _ in salidas if av}
+    errores = {mes: err for mes, _, _, err in salidas if err}
+    dfs = [df for _, df, _, err in salidas if err is None and not df.empty]
+    if not dfs:
+        return {}, avisos, errores
+
+    anual = pd.concat(dfs, ignore_index=True)
+    anual["__m"] = anual["Mes"].apply(orden_mes)
+    anual = anual.sort_values(["Sucursal", "__m"], kind="stable").drop(columns="__m")
+
+    por_sucursal = {
+        suc: g.reset_index(drop=True)
+        for suc, g in anual.groupby("Sucursal", sort=True)
+    }
+    return por_sucursal, avisos, errores
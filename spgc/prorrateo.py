@@ -0,0 +1,90 @@
+"""
+Motor de prorrateo de Gasto General (comunes INTERNO / EXTERNO).
+
+El prorrateo se resuelve como producto de matrices:
+
+    montos (áreas × tipos)  @  porcentajes (tipos × sucursales)
+        -> cargos (áreas × sucursales)
+
+y el redondeo a centavos usa "residuo mayor" para que la suma de las filas de
+cada AREA/CUENTA sea exactamente su TOTAL_AREA redondeado a 2 decimales.
+"""
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+COLS_PRORR = ["AREA/CUENTA", "SUCURSAL", "TIPO DISTRIBUCIÓN", "TIPO COSTO", "CARGO ASIGNADO"]
+
+
+def _redondeo_residuo_mayor(exacto: np.ndarray, elegible: np.ndarray) -> np.ndarray:
+    """
+    Redondea cada fila de ``exacto`` (en centavos) a enteros de forma que la
+    suma de la fila sea el total de la fila redondeado. Los centavos que faltan
+    tras truncar se asignan a las celdas con mayor parte fraccionaria.
+    """
+    piso = np.floor(exacto)
+    frac = np.where(elegible, exacto - piso, -1.0)
+
+    objetivo = np.rint(np.where(elegible, exacto, 0.0).sum(axis=1))
+    faltan = objetivo - np.where(elegible, piso, 0.0).sum(axis=1)
+    faltan = np.clip(faltan, 0, elegible.sum(axis=1))
+
+    # rango de cada celda dentro de su fila (0 = mayor fracción); orden estable
+    orden = np.argsort(-frac, axis=1, kind="stable")
+    rango = np.empty_like(orden)
+    filas = np.arange(exacto.shape[0])[:, None]
+    rango[filas, orden] = np.arange(exacto.shape[1])[None, :]
+
+    return piso + (rango < faltan[:, None])
+
+
+def prorratear_gasto_general(gg_agr: pd.DataFrame, porcentajes: pd.DataFrame) -> Tuple[pd.DataFrame, List[Tuple[str, str]]]:
+    """
+    Expande ``gg_agr`` (AREA/CUENTA, TIPO COSTO, TOTAL_AREA, TIPO DISTRIBUCIÓN)
+    a una fila por sucursal según ``porcentajes`` (índice SUCURSAL, columnas =
+    tipos de distribución en mayúsculas).
+
+    Solo se generan filas para sucursales con porcentaje > 0, en el mismo orden
+    que el recorrido fila por fila (área y luego sucursal).
+
+    Regresa ``(prorr_gg, omitidas)`` donde ``omitidas`` lista los pares
+    (tipo, AREA/CUENTA) cuyo tipo de distribución no existe en ``porcentajes``.
+    """
+    tipos_area = gg_agr["TIPO DISTRIBUCIÓN"].astype(str).str.upper()
+    con_pct = tipos_area.isin(porcentajes.columns).to_numpy()
+
+    omitidas = list(zip(tipos_area[~con_pct], gg_agr.loc[~con_pct, "AREA/CUENTA"]))
+
+    base = gg_agr[con_pct]
+    tipos_area = tipos_area[con_pct]
+    if base.empty or porcentajes.empty:
+        return pd.DataFrame(columns=COLS_PRORR), omitidas
+
+    # tipos × sucursales
+    tipos, idx_tipo = np.unique(tipos_area.to_numpy(), return_inverse=True)
+    pct = porcentajes[list(tipos)].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float).T
+    pct_pos = np.where(pct > 0, pct, 0.0)  # NaN y <= 0 no reciben cargo
+
+    # áreas × tipos (cada área tiene un solo tipo)
+    totales = base["TOTAL_AREA"].to_numpy(dtype=float)
+    montos = np.zeros((len(base), len(tipos)))
+    montos[np.arange(len(base)), idx_tipo] = totales
+    uno_hot = (np.arange(len(tipos))[None, :] == idx_tipo[:, None]).astype(float)
+
+    cargos = montos @ pct_pos                       # áreas × sucursales
+    elegible = (uno_hot @ (pct_pos > 0)) > 0
+
+    centavos = _redondeo_residuo_mayor(cargos * 100.0, elegible)
+
+    i_area, i_suc = np.nonzero(elegible)
+    sucs = porcentajes.index.astype(str).str.upper().str.strip().to_numpy()
+
+    prorr_gg = pd.DataFrame({
+        "AREA/CUENTA": base["AREA/CUENTA"].to_numpy()[i_area],
+        "SUCURSAL": sucs[i_suc],
+        "TIPO DISTRIBUCIÓN": base["TIPO DISTRIBUCIÓN"].to_numpy()[i_area],  # como está en catálogo
+        "TIPO COSTO": base["TIPO COSTO"].to_numpy()[i_area],
+        "CARGO ASIGNADO": np.round(centavos[i_area, i_suc] / 100.0, 2),
+    })
+    return prorr_gg, omitidas
@@ -0,0 +1,68 @@
+"""
+Reglas declarativas de TIPO COSTO para los comunes de PASO 1.
+
+Cada regla es ``(prioridad, sucursal, concepto_prefijo, tipo_costo)``:
+aplica a las filas cuya SUCURSAL sea ``sucursal`` y cuyo CONCEPTO empiece
+con ``concepto_prefijo`` (vacío = cualquiera). Gana la regla de menor
+prioridad. Las reglas se compilan a máscaras de ``np.select`` que se evalúan
+sobre columnas completas.
+
+La tabla vive en Supabase (``reglas_tipo_costo``) o, si no está disponible,
+en ``reglas_tipo_costo.csv`` junto a este módulo.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RUTA_REGLAS = Path(__file__).with_name("reglas_tipo_costo.csv")
+COLS_REGLAS = ["prioridad", "sucursal", "concepto_prefijo", "tipo_costo"]
+
+# si ninguna regla aplica
+TIPO_COSTO_DEFAULT = "COMUN INTERNO"
+
+
+def normalizar_reglas(reglas: pd.DataFrame) -> pd.DataFrame:
+    faltan = set(COLS_REGLAS) - set(reglas.columns)
+    if reglas.empty or faltan:
+        raise ValueError(f"Tabla de reglas de TIPO COSTO vacía o incompleta (faltan: {sorted(faltan)})")
+
+    reglas = reglas[COLS_REGLAS].copy()
+    for c in ["sucursal", "concepto_prefijo"]:
+        reglas[c] = reglas[c].fillna("").astype(str).str.strip().str.upper()
+    reglas["tipo_costo"] = reglas["tipo_costo"].astype(str).str.strip().str.upper()
+    reglas["prioridad"] = pd.to_numeric(reglas["prioridad"], errors="coerce").fillna(np.inf)
+    return reglas.sort_values("prioridad", kind="stable").reset_index(drop=True)
+
+
+def cargar_reglas(ruta=RUTA_REGLAS) -> pd.DataFrame:
+    return normalizar_reglas(pd.read_csv(ruta, dtype=str, keep_default_na=False))
+
+
+def _factorizar(serie: pd.Series):
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    return codigos, pd.Series(unicos, dtype=object).astype(str).str.strip().str.upper()
+
+
+def clasificar_tipo_costo(df: pd.DataFrame, reglas: pd.DataFrame = None) -> np.ndarray:
+    """TIPO COSTO de cada fila de ``df`` (columnas SUCURSAL y CONCEPTO)."""
+    if reglas is None:
+        reglas = cargar_reglas()
+
+    # se normalizan solo los valores distintos (pocos) y se expanden por código
+    cod_suc, suc = _factorizar(df["SUCURSAL"])
+    if "CONCEPTO" in df.columns:
+        cod_con, concepto = _factorizar(df["CONCEPTO"])
+    else:
+        cod_con, concepto = np.zeros(len(df), dtype=np.intp), pd.Series([""])
+
+    # una máscara por sucursal / prefijo distintos, reutilizada entre reglas
+    por_suc = {s: suc.eq(s).to_numpy()[cod_suc] for s in reglas["sucursal"].unique() if s}
+    por_pref = {p: concepto.str.startswith(p).to_numpy()[cod_con] for p in reglas["concepto_prefijo"].unique() if p}
+    todas = np.ones(len(df), dtype=bool)
+
+    condiciones = [
+        por_suc.get(r.sucursal, todas) & por_pref.get(r.concepto_prefijo, todas)
+        for r in reglas.itertuples(index=False)
+    ]
+    return np.select(condiciones, reglas["tipo_costo"].tolist(), default=TIPO_COSTO_DEFAULT)
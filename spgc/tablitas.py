@@ -0,0 +1,114 @@
+"""
+Tablitas mensuales de costo por sucursal (Resumen superior, GASTOS INDIRECTOS
+y AREA-TIPO GASTO), calculadas para todas las sucursales del GTS en una sola
+pasada agrupada sobre el prorrateo.
+"""
+from io import BytesIO
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+Tablitas = Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+
+
+def _por_sucursal(prorr: pd.DataFrame, tipos, nombre_area: str) -> Tuple[Dict[str, pd.DataFrame], pd.DataFrame]:
+    # groupby (SUCURSAL, AREA/CUENTA) una sola vez y se reparte por sucursal
+    sub = prorr[prorr["TIPO COSTO"].isin(tipos)]
+    agr = (
+        sub.groupby(["SUCURSAL", "AREA/CUENTA"], as_index=False)["CARGO ASIGNADO"]
+           .sum()
+           .rename(columns={"AREA/CUENTA": nombre_area, "CARGO ASIGNADO": "IMPORTE"})
+    )
+    vacia = agr.iloc[0:0].drop(columns="SUCURSAL").reset_index(drop=True)
+    grupos = {
+        suc: g.drop(columns="SUCURSAL").reset_index(drop=True)
+        for suc, g in agr.groupby("SUCURSAL", sort=False)
+    }
+    return grupos, vacia
+
+
+def generar_tablitas(
+    prorr: pd.DataFrame,
+    df_gts: pd.DataFrame,
+    catalogo: pd.DataFrame,
+    col_fact: str,
+    col_mc: str,
+) -> Dict[str, Tablitas]:
+    """
+    ``{sucursal: (tabla_top, tabla_gi, tabla_ge)}`` para cada SUCURSAL de
+    ``df_gts`` (ordenadas). ``prorr``, ``df_gts`` y ``catalogo`` ya vienen con
+    columnas y SUCURSAL / AREA/CUENTA normalizadas a mayúsculas.
+    """
+    gi_por_suc, gi_vacia = _por_sucursal(prorr, ["COSTO INDIRECTO"], "GASTOS INDIRECTOS")
+    ge_por_suc, ge_vacia = _por_sucursal(prorr, ["COMUN EXTERNO", "COMUN INTERNO"], "AREA-TIPO GASTO")
+
+    cat_dist = catalogo[["AREA/CUENTA", "TIPO DISTRIBUCIÓN"]].rename(columns={"AREA/CUENTA": "AREA_KEY"})
+    gts = df_gts.drop_duplicates(subset="SUCURSAL", keep="first").set_index("SUCURSAL")
+
+    out = {}
+    for suc in sorted(df_gts["SUCURSAL"].dropna().unique().tolist()):
+        # ---- 1) Datos principales desde GTS ----
+        facturacion = float(gts.at[suc, col_fact] or 0)
+        mc = float(gts.at[suc, col_mc] or 0)
+
+        # costos directos = facturación - MC
+        costos_directos = facturacion - mc
+        utilidad = mc
+
+        # ---- 2) GASTOS INDIRECTOS ----
+        tabla_gi = (
+            gi_por_suc.get(suc, gi_vacia)
+              .sort_values("IMPORTE", ascending=False)
+              .reset_index(drop=True)
+        )
+        tabla_gi["%"] = np.where(facturacion != 0, tabla_gi["IMPORTE"] / facturacion, 0.0)
+
+        total_ci = float(tabla_gi["IMPORTE"].sum())
+        pct_ci = (total_ci / facturacion) if facturacion != 0 else 0.0
+
+        # ---- 3) AREA-TIPO GASTO + método distribución desde catálogo ----
+        tabla_ge = ge_por_suc.get(suc, ge_vacia).copy()
+        tabla_ge["AREA_KEY"] = tabla_ge["AREA-TIPO GASTO"].astype(str).str.strip().str.upper()
+        tabla_ge = tabla_ge.merge(cat_dist, on="AREA_KEY", how="left").drop(columns=["AREA_KEY"])
+
+        tabla_ge["%"] = np.where(facturacion != 0, tabla_ge["IMPORTE"] / facturacion, 0.0)
+        tabla_ge = tabla_ge.sort_values("IMPORTE", ascending=False).reset_index(drop=True)
+
+        total_gn = float(tabla_ge["IMPORTE"].sum())
+        pct_gn = (total_gn / facturacion) if facturacion != 0 else 0.0
+
+        # ---- 4) Tablita superior ----
+        pct_ut_bruta = (utilidad / facturacion) if facturacion != 0 else 0.0
+        ut_per = utilidad - total_ci - total_gn
+        pct_ut_per = (ut_per / facturacion) if facturacion != 0 else 0.0
+
+        tabla_top = pd.DataFrame([{
+            "Sucursal": suc,
+            "Facturación": facturacion,
+            "Costos Directos": costos_directos,
+            "Utilidad": utilidad,
+            "% Ut Bruta": pct_ut_bruta,
+            "Costos Indirectos": total_ci,
+            "% CI": pct_ci,
+            "Gastos Generales": total_gn,
+            "% GN": pct_gn,
+            "UT/PER": ut_per,
+            "%UT/PER": pct_ut_per
+        }])
+
+        out[suc] = (tabla_top, tabla_gi, tabla_ge)
+
+    return out
+
+
+def exportar_tablitas_excel(tablitas: Dict[str, Tablitas]) -> bytes:
+    """Un libro con una hoja por sucursal, con el layout de las tablitas."""
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        for suc, (tabla_top, tabla_gi, tabla_ge) in tablitas.items():
+            sheet = str(suc)[:31]  # límite Excel
+            tabla_top.to_excel(writer, sheet_name=sheet, index=False, startrow=0, startcol=0)
+            tabla_gi.to_excel(writer, sheet_name=sheet, index=False, startrow=4, startcol=0)
+            tabla_ge.to_excel(writer, sheet_name=sheet, index=False, startrow=4, startcol=6)
+    return buffer.getvalue()
@@ -0,0 +1,69 @@
+"""
+Regresión de ``process_report`` (STAR 1).
+
+Cada ``tests/data/star1/<muestra>.xls`` es una exportación pequeña de STAR 1
+(HTML disfrazado de .xls, como las reales) y ``<muestra>.csv`` es lo que daba
+el ``process_report`` de antes de las optimizaciones sobre lo que entrega el
+lector actual (``_read_excel_any``). La salida actual debe ser idéntica byte
+por byte.
+
+Solo cubre el limpiador, no el lector: el lector anterior (``read_html``)
+vaciaba celdas con texto como "None" o "nan" y el actual las deja tal cual,
+así que de punta a punta las salidas no son iguales a propósito.
+
+También una ida y vuelta de ``exportar_excel``: las fechas deben volver como
+fecha de Excel (con formato de fecha), no como número serial.
+
+    pytest -q tests/test_auxiliares.py
+"""
+import io
+from datetime import datetime
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from spgc.auxiliares import _read_excel_any, exportar_excel, process_report
+
+DATOS = Path(__file__).parent / "data" / "star1"
+MUESTRAS = sorted(p.stem for p in DATOS.glob("*.xls"))
+
+
+def test_hay_muestras():
+    assert MUESTRAS, f"sin muestras en {DATOS}"
+
+
+@pytest.mark.parametrize("muestra", MUESTRAS)
+def test_process_report_igual_byte_por_byte(muestra):
+    raw = _read_excel_any((DATOS / f"{muestra}.xls").read_bytes())
+    salida = process_report(raw).to_csv(index=False).encode("utf-8")
+    assert salida == (DATOS / f"{muestra}.csv").read_bytes()
+
+
+def _leer_xlsx(contenido: bytes):
+    return openpyxl.load_workbook(io.BytesIO(contenido)).active
+
+
+def test_exportar_excel_fechas_con_formato():
+    df = pd.DataFrame({
+        "Cuenta": ["A", "B", "C"],
+        "Fecha": pd.to_datetime(["2025-01-31", None, "2025-03-15"]),
+        "Cargos": [1.5, 0.0, 2.25],
+    })
+    ws = _leer_xlsx(exportar_excel(df))
+
+    assert [c.value for c in ws[1]] == ["Cuenta", "Fecha", "Cargos"]
+    assert ws["B2"].value == datetime(2025, 1, 31)
+    assert ws["B2"].number_format == "yyyy-mm-dd"
+    assert ws["B3"].value is None
+    assert ws["B4"].value == datetime(2025, 3, 15)
+    assert ws["C4"].value == 2.25
+
+
+def test_exportar_excel_fechas_con_hora():
+    df = pd.DataFrame({"Fecha": [datetime(2025, 1, 31, 8, 30), datetime(2025, 2, 1)]})
+    ws = _leer_xlsx(exportar_excel(df))
+
+    assert ws["A2"].value == datetime(2025, 1, 31, 8, 30)
+    assert ws["A2"].number_format == "yyyy-mm-dd hh:mm:ss"
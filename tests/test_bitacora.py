@@ -0,0 +1,53 @@
+"""
+Bitácora de UUID: filas en JSON (Decimal y escalares numpy incluidos) y
+``version`` del lector como parte de la llave de ``buscar``.
+
+    pytest -q tests/test_bitacora.py
+"""
+import sqlite3
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from spgc.bitacora import BitacoraUUID
+
+FILAS = [{"UUID": "abc-1", "CANTIDAD": Decimal("1.50"), "SUBTOTAL": 10.25, "FILAS": np.int64(3), "IVA": np.float64(1.64)}]
+
+
+def test_guardar_y_buscar_ida_y_vuelta(tmp_path):
+    b = BitacoraUUID(tmp_path / "f.sqlite", version="v1")
+    assert b.guardar("xml", [("abc-1", "a.xml", "K9", FILAS, {"estatus": "OK"}), ("", "b.xml", "K9", FILAS, {})]) == 1
+
+    reg = b.buscar("xml", " ABC-1 ")
+    assert reg.uuid == "ABC-1" and reg.archivo == "a.xml" and reg.debug == {"estatus": "OK"}
+    assert reg.filas == [{"UUID": "abc-1", "CANTIDAD": Decimal("1.50"), "SUBTOTAL": 10.25, "FILAS": 3, "IVA": 1.64}]
+    assert isinstance(reg.filas[0]["CANTIDAD"], Decimal)
+    assert b.filas("xml") == reg.filas
+    assert b.buscar("pdf", "abc-1") is None
+
+    texto = sqlite3.connect(tmp_path / "f.sqlite").execute("SELECT filas FROM facturas").fetchone()[0]
+    assert '"$decimal": "1.50"' in texto
+
+
+def test_otra_version_no_se_encuentra(tmp_path):
+    BitacoraUUID(tmp_path / "f.sqlite", version="v1").guardar("xml", [("abc-1", "a.xml", "K9", FILAS, {})])
+
+    nueva = BitacoraUUID(tmp_path / "f.sqlite", version="v2")
+    assert nueva.buscar("xml", "abc-1") is None
+    assert nueva.total("xml") == 1  # el historial sigue completo
+    nueva.guardar("xml", [("abc-1", "a.xml", "K9", FILAS, {})])
+    assert nueva.buscar("xml", "abc-1") is not None
+    assert nueva.total("xml") == 1
+
+
+def test_tabla_ajena_no_se_toca(tmp_path):
+    con = sqlite3.connect(tmp_path / "f.sqlite")
+    con.execute("CREATE TABLE facturas (id INTEGER PRIMARY KEY, cliente TEXT)")
+    con.execute("INSERT INTO facturas (cliente) VALUES ('ACME')")
+    con.commit()
+    con.close()
+
+    with pytest.raises(ValueError, match="facturas"):
+        BitacoraUUID(tmp_path / "f.sqlite", version="v1")
+    assert sqlite3.connect(tmp_path / "f.sqlite").execute("SELECT cliente FROM facturas").fetchall() == [("ACME",)]
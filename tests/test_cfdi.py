@@ -0,0 +1,94 @@
+"""
+Ruta lxml (``rapido=True``) contra ElementTree en CFDI con nodos fuera de su
+lugar habitual: las dos rutas deben dar las mismas filas.
+
+    pytest -q tests/test_cfdi.py
+"""
+import pytest
+
+from spgc.cfdi import NS_CFDI, NS_TFD, PROVEEDORES, SAT_GENERICO, indice_lxml, parse_xml_bytes
+
+FORMATOS = ["K9", "ROYAN", "WASH N CROSS", SAT_GENERICO]
+VERSIONES = ["3.3", "4.0"]
+COMPLEMENTO = b"<cfdi:Complemento>"
+FIN_COMPLEMENTO = b"</cfdi:Complemento>"
+
+
+def _cfdi(formato: str, version: str, addenda: str = "") -> bytes:
+    """CFDI mínimo de ``formato`` con dos conceptos gravados; ``addenda`` va tal cual."""
+    emisor, rfc = (PROVEEDORES[formato][0], PROVEEDORES[formato][-1]) if formato in PROVEEDORES \
+        else ("SERVICIOS DEL NORTE SA DE CV", "SNO0101019A1")
+    conceptos = "".join(
+        f'<cfdi:Concepto ClaveProdServ="78181500" Cantidad="1" ClaveUnidad="E48" Unidad="SERVICIO" '
+        f'Descripcion="LAVADO DE CAJA UNIDAD: T{k}" ValorUnitario="{importe}" Importe="{importe}" ObjetoImp="02">'
+        f'<cfdi:Impuestos><cfdi:Traslados><cfdi:Traslado Base="{importe}" Impuesto="002" TipoFactor="Tasa" '
+        f'TasaOCuota="0.160000" Importe="{float(importe) * 0.16:.2f}"/></cfdi:Traslados></cfdi:Impuestos>'
+        "</cfdi:Concepto>"
+        for k, importe in enumerate(["100.00", "250.50"])
+    )
+    if formato == "K9":
+        addenda = "<Observaciones>ORDEN K9 - 1234 SERVICIO REALIZADO 05/02/2025 10:00 CAJA C12</Observaciones>" + addenda
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<cfdi:Comprobante xmlns:cfdi="{NS_CFDI[version]}" xmlns:tfd="{NS_TFD}" Version="{version}" '
+        'Serie="A" Folio="7" Fecha="2025-02-05T10:00:00" Moneda="MXN" TipoDeComprobante="I" SubTotal="0" Total="0">'
+        f'<cfdi:Emisor Rfc="{rfc}" Nombre="{emisor}" RegimenFiscal="612"/>'
+        '<cfdi:Receptor Rfc="ITR150101AB1" Nombre="IGLOO TRANSPORT SA DE CV" UsoCFDI="G03"/>'
+        f"<cfdi:Conceptos>{conceptos}</cfdi:Conceptos>"
+        '<cfdi:Complemento><tfd:TimbreFiscalDigital Version="1.1" UUID="5f0e1b2c-3d4e-4f50-8a6b-7c8d9e0f1a2b" '
+        'FechaTimbrado="2025-02-05T10:05:00"/></cfdi:Complemento>'
+        f"{f'<cfdi:Addenda>{addenda}</cfdi:Addenda>' if addenda else ''}</cfdi:Comprobante>"
+    ).encode("utf-8")
+
+
+def _mover_tfd_a_addenda(xml: bytes) -> bytes:
+    ini = xml.index(COMPLEMENTO)
+    fin = xml.index(FIN_COMPLEMENTO) + len(FIN_COMPLEMENTO)
+    tfd = xml[ini + len(COMPLEMENTO):fin - len(FIN_COMPLEMENTO)]
+    sin_complemento = xml[:ini] + xml[fin:]
+    if b"<cfdi:Addenda>" in sin_complemento:
+        return sin_complemento.replace(b"<cfdi:Addenda>", b"<cfdi:Addenda>" + tfd)
+    return sin_complemento.replace(b"</cfdi:Comprobante>", b"<cfdi:Addenda>" + tfd + b"</cfdi:Addenda></cfdi:Comprobante>")
+
+
+def _traslado_en_complemento_concepto(xml: bytes) -> bytes:
+    extra = (
+        b'<cfdi:ComplementoConcepto><otro:Impuestos xmlns:otro="urn:otro"><otro:Traslado Base="100.00" '
+        b'Impuesto="002" TipoFactor="Tasa" TasaOCuota="0.160000" Importe="16.00"/></otro:Impuestos>'
+        b"</cfdi:ComplementoConcepto></cfdi:Concepto>"
+    )
+    return xml.replace(b"</cfdi:Concepto>", extra, 1)
+
+
+def _ambas_rutas(xml: bytes):
+    assert indice_lxml(xml) is not None
+    rapido, _ = parse_xml_bytes("f.xml", xml, rapido=True)
+    lento, _ = parse_xml_bytes("f.xml", xml, rapido=False)
+    assert rapido == lento
+    return rapido
+
+
+@pytest.mark.parametrize("version", VERSIONES)
+@pytest.mark.parametrize("formato", FORMATOS)
+def test_tfd_fuera_del_complemento(formato, version):
+    xml = _mover_tfd_a_addenda(_cfdi(formato, version))
+    assert COMPLEMENTO not in xml and NS_TFD.encode() in xml
+    assert _ambas_rutas(xml)[0]["UUID"]
+
+
+@pytest.mark.parametrize("version", VERSIONES)
+@pytest.mark.parametrize("formato", FORMATOS)
+def test_traslado_fuera_de_impuestos(formato, version):
+    _ambas_rutas(_traslado_en_complemento_concepto(_cfdi(formato, version)))
+
+
+@pytest.mark.parametrize("version", VERSIONES)
+@pytest.mark.parametrize("formato", FORMATOS)
+def test_nodos_del_esquema_dentro_de_la_addenda(formato, version):
+    addenda = (
+        '<prov:Datos xmlns:prov="urn:proveedor"><prov:Emisor Nombre="OTRO EMISOR" Rfc="XAXX010101000"/>'
+        '<prov:Receptor Nombre="OTRO RECEPTOR"/><prov:Concepto Descripcion="NO ES PARTIDA" Importe="999.00"/>'
+        "</prov:Datos>"
+    )
+    filas = _ambas_rutas(_cfdi(formato, version, addenda))
+    assert len(filas) == len(_ambas_rutas(_cfdi(formato, version))) > 0